@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""Benchmark the phases of main.py against a synthetic Logseq graph.
+
+Generates a graph of configurable size, then times config load, raw file read,
+parsing (cold and with a warm parse cache), tracker checks, dispatch to a
+local stub ntfy server, which can enforce a rate limit of its own, and the
+outbox writes around it. It also times complete cold starts of main.py on a tiny
+graph with nothing due, against a target. Results are written as JSON so runs
+from different versions can be compared with --compare.
+
+    python3 bench/bench_notifier.py --files 2000 --blocks 40 --output bench_output.json
+    python3 bench/bench_notifier.py --compare bench_output.json
+    python3 bench/bench_notifier.py --due-now 200 --stub-burst 20 --stub-per-second 10
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import statistics
+import subprocess
+import argparse
+import platform
+import tempfile
+import math
+import threading
+import contextlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPT_DIR))
+import main  # noqa: E402
+
+# A cron run with nothing due should finish within this many milliseconds
+STARTUP_TARGET_MS = 200
+
+# --- Synthetic graph ---
+
+def generate_graph(graph_root, files, blocks_per_file, scheduled_percent, due_now_count, seed=0):
+    """Write a synthetic graph and return the number of scheduled blocks it contains.
+
+    Half of the files are journals, half pages. Scheduled blocks are spread over
+    +/- one year, except due_now_count of them which fall due two minutes from now.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    os.makedirs(os.path.join(graph_root, 'pages'), exist_ok=True)
+    os.makedirs(os.path.join(graph_root, 'journals'), exist_ok=True)
+    scheduled_blocks = 0
+    for file_index in range(files):
+        if file_index % 2:
+            day = now.date() - timedelta(days=file_index // 2)
+            path = os.path.join(graph_root, 'journals', f"{day:%Y_%m_%d}.md")
+        else:
+            path = os.path.join(graph_root, 'pages', f"Synthetic Page {file_index}.md")
+        lines = []
+        for block_index in range(blocks_per_file):
+            if rng.random() * 100 < scheduled_percent:
+                if scheduled_blocks < due_now_count:
+                    due = now + timedelta(minutes=2)
+                else:
+                    due = now + timedelta(days=rng.randint(-365, 365), minutes=rng.randint(0, 1439))
+                scheduled_blocks += 1
+                lines.append(f"- TODO Synthetic task {file_index}-{block_index} #bench\n")
+                lines.append(f"  SCHEDULED: <{due:%Y-%m-%d %a %H:%M}>\n")
+            else:
+                lines.append(f"- Note {block_index} linking [[Synthetic Page {rng.randint(0, files)}]] with some text\n")
+                lines.append("\t- child block with a bit more prose in it\n")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+    return scheduled_blocks
+
+def generate_tracker(tracker_file, history):
+    """Fill a tracker with history entries of past notifications."""
+    tracker = main.NotificationTracker(tracker_file)
+    tracker.enqueue([{'ids': [f"logseq_md_event_bench_history_{index}_202001010000" for index in range(history)]}])
+    tracker.delivered([(row_id, message) for row_id, message, _, _ in tracker.outbox_due(time.time())])
+    tracker.close()
+
+# --- Stub ntfy server ---
+
+class StubNtfyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, Nagle plus delayed ACKs adds ~40 ms per reply.
+    disable_nagle_algorithm = True
+    received = 0
+    # TCP connections accepted, to check that clients keep theirs alive
+    connections = 0
+    # Requests still to answer with a 503, to exercise retries
+    fail_next = 0
+    # Optional token bucket like ntfy's per-client request limit: (burst, per_second), and its state
+    limit = None
+    tokens = 0.0
+    updated = 0.0
+    rejected = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubNtfyHandler.lock:
+            StubNtfyHandler.connections += 1
+
+    def take_failure(self):
+        """Return whether this request should get a 503."""
+        with StubNtfyHandler.lock:
+            if StubNtfyHandler.fail_next <= 0:
+                return False
+            StubNtfyHandler.fail_next -= 1
+            return True
+
+    def take_token(self):
+        """Return 0 if the request is within the limit, else the whole seconds until it would be."""
+        if StubNtfyHandler.limit is None:
+            return 0
+        burst, per_second = StubNtfyHandler.limit
+        with StubNtfyHandler.lock:
+            now = time.monotonic()
+            StubNtfyHandler.tokens = min(burst, StubNtfyHandler.tokens + (now - StubNtfyHandler.updated) * per_second)
+            StubNtfyHandler.updated = now
+            if StubNtfyHandler.tokens >= 1:
+                StubNtfyHandler.tokens -= 1
+                return 0
+            StubNtfyHandler.rejected += 1
+            return max(1, math.ceil((1 - StubNtfyHandler.tokens) / per_second))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.take_failure():
+            response = b'{"code":50301,"http":503,"error":"service unavailable"}'
+            self.send_response(503)
+        elif (retry_after := self.take_token()):
+            response = b'{"code":42901,"http":429,"error":"limit reached: too many requests"}'
+            self.send_response(429)
+            self.send_header('Retry-After', str(retry_after))
+        else:
+            StubNtfyHandler.received += 1
+            response = b'{"id":"bench","event":"message"}'
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_server(burst=0, per_second=0, serve=True):
+    StubNtfyHandler.received = StubNtfyHandler.connections = StubNtfyHandler.fail_next = StubNtfyHandler.rejected = 0
+    StubNtfyHandler.limit = None
+    if per_second > 0:
+        StubNtfyHandler.limit = (burst, per_second)
+        StubNtfyHandler.tokens = float(burst)
+        StubNtfyHandler.updated = time.monotonic()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubNtfyHandler)
+    if serve:
+        serve_stub_server(server)
+    return server
+
+def serve_stub_server(server):
+    """Answer the stub server's requests on a background thread."""
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+# --- Phases ---
+
+@contextlib.contextmanager
+def quiet():
+    """Silence main.py's progress output so it doesn't dominate the timings."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def timed(results, phase, func, *args, **kwargs):
+    start = time.perf_counter()
+    with quiet():
+        value = func(*args, **kwargs)
+    results[phase] = round(time.perf_counter() - start, 6)
+    return value
+
+def read_all_files(markdown_files):
+    total_bytes = 0
+    for path, _ in markdown_files:
+        with open(path, 'rb') as f:
+            total_bytes += len(f.read())
+    return total_bytes
+
+def tracker_checks(tracker_file, due_events):
+    tracker = main.NotificationTracker(tracker_file)
+    approved = sum(1 for event in due_events if main.should_send_notification(tracker, event.id))
+    tracker.close()
+    return approved
+
+def outbox_writes(tracker_file, messages, send_results):
+    """Queue the messages and record the delivered ones, the tracker writes main.py does around a dispatch."""
+    tracker = main.NotificationTracker(tracker_file)
+    tracker.enqueue(messages)
+    rows = tracker.outbox_due(time.time())
+    tracker.delivered([(row_id, message) for (row_id, message, _, _), result in zip(rows, send_results) if result['ok']])
+    tracker.close()
+
+def measure_startup(work_dir, runs, target_ms):
+    """Time complete `main.py --config` runs on a one-page graph with nothing due."""
+    startup_dir = os.path.join(work_dir, 'startup')
+    os.makedirs(startup_dir)
+    markdown_file = os.path.join(startup_dir, 'Tasks.md')
+    with open(markdown_file, 'w', encoding='utf-8') as f:
+        f.write("- TODO Far away task\n  SCHEDULED: <2099-01-01 Thu 09:00>\n")
+    config_path = os.path.join(startup_dir, main.CONFIG_FILE_NAME)
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'paths': {'default': {
+            'markdown': markdown_file, 'output_dir': startup_dir,
+            'notification_tracker': os.path.join(startup_dir, 'notification_tracker_markdown.sqlite3'),
+            'ntfy_topic': 'bench', 'ntfy_server': 'http://127.0.0.1:9',
+        }}}, f, indent=4)
+    command = [sys.executable, os.path.join(os.path.dirname(SCRIPT_DIR), 'main.py'), '--config', config_path]
+    environment = dict(os.environ)
+    environment.pop('LOGSEQ_NOTIFY_VERBOSE', None)
+    # The first run fills the parse cache; every later run is a regular steady-state cron run.
+    subprocess.run(command, check=True, capture_output=True, env=environment)
+    samples_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True, env=environment)
+        samples_ms.append((time.perf_counter() - start) * 1000)
+    median_ms = statistics.median(samples_ms) if samples_ms else None
+    return {
+        'runs': runs,
+        'median_ms': round(median_ms, 2) if median_ms is not None else None,
+        'min_ms': round(min(samples_ms), 2) if samples_ms else None,
+        'target_ms': target_ms,
+        'within_target': median_ms is not None and median_ms <= target_ms,
+    }
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='logseq_notify_bench_')
+    try:
+        graph_root = os.path.join(work_dir, 'graph')
+        output_dir = os.path.join(work_dir, 'output')
+        os.makedirs(output_dir)
+        scheduled_blocks = generate_graph(graph_root, args.files, args.blocks, args.scheduled_percent, args.due_now, args.seed)
+        tracker_file = os.path.join(output_dir, 'notification_tracker_markdown.sqlite3')
+        generate_tracker(tracker_file, args.tracker_history)
+
+        # Bound now but served only from the dispatch step on: a real run parses with no other thread running,
+        # which lets scan_markdown_files fork its workers instead of starting them from a fork server.
+        server = start_stub_server(args.stub_burst, args.stub_per_second, serve=False)
+        # The client limits itself to what the stub allows, unless the stub's 429s are what is being measured.
+        if args.stub_per_second > 0 and not args.no_client_rate_limit:
+            main.configure_rate_limit({'burst': args.stub_burst, 'per_second': args.stub_per_second})
+        else:
+            main.configure_rate_limit(False)
+        config_path = os.path.join(work_dir, main.CONFIG_FILE_NAME)
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump({'paths': {'default': {
+                'markdown': '', 'graph_root': graph_root, 'output_dir': output_dir,
+                'notification_tracker': tracker_file, 'ntfy_topic': 'bench',
+                'ntfy_server': f"http://127.0.0.1:{server.server_port}",
+            }}}, f, indent=4)
+        main.IS_TERMUX = False
+
+        timings = {}
+        config, _ = timed(timings, 'config_load', main.load_config, config_path)
+        paths_config = config['paths']['default']
+        markdown_files = timed(timings, 'list_files', main.find_graph_markdown_files, graph_root)
+        total_bytes = timed(timings, 'file_read', read_all_files, markdown_files)
+        cache_file = os.path.join(output_dir, main.PARSE_CACHE_FILE_NAME)
+        events, _ = timed(timings, 'parse_cold', main.scan_markdown_files, markdown_files, cache_file, args.workers)
+        timed(timings, 'parse_warm_cache', main.scan_markdown_files, markdown_files, cache_file, args.workers)
+
+        now_epoch = time.time()
+        resolve_leads = main.lead_time_resolver(paths_config)
+        due_events = timed(timings, 'due_index', main.due_reminders, events, resolve_leads, now_epoch, now_epoch + main.NOTIFY_WINDOW_SECONDS)
+        approved = timed(timings, 'tracker_checks', tracker_checks, tracker_file, due_events)
+
+        serve_stub_server(server)
+        messages = [main.build_event_notification(event, 'bench', paths_config['ntfy_server']) for event in due_events]
+        send_results = timed(timings, 'dispatch', main.send_ntfy_batch, messages, args.send_workers)
+        timed(timings, 'outbox_writes', outbox_writes, tracker_file, messages, send_results)
+        with quiet():
+            main.close_ntfy_connections()
+        server.shutdown()
+
+        startup = measure_startup(work_dir, args.startup_runs, args.startup_target_ms)
+
+        return {
+            'version': 1,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': {
+                'files': args.files, 'blocks': args.blocks, 'scheduled_percent': args.scheduled_percent,
+                'due_now': args.due_now, 'tracker_history': args.tracker_history,
+                'workers': args.workers, 'send_workers': args.send_workers, 'seed': args.seed,
+                'stub_burst': args.stub_burst, 'stub_per_second': args.stub_per_second,
+                'client_rate_limit': args.stub_per_second > 0 and not args.no_client_rate_limit,
+            },
+            'counts': {
+                'files': len(markdown_files), 'bytes': total_bytes, 'scheduled_blocks': scheduled_blocks,
+                'events': len(events), 'due': len(due_events), 'approved': approved,
+                'sent': sum(1 for result in send_results if result['ok']), 'stub_received': StubNtfyHandler.received,
+                'deferred': sum(1 for result in send_results if not result['attempts'] and result['retry_after'] is not None),
+                'stub_rate_limited': StubNtfyHandler.rejected,
+            },
+            'timings_seconds': timings,
+            'startup': startup,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare(current, baseline):
+    """Print each phase's time next to the baseline's, with the ratio."""
+    current_timings = dict(current['timings_seconds'])
+    baseline_timings = dict(baseline.get('timings_seconds', {}))
+    for results, timings in ((current, current_timings), (baseline, baseline_timings)):
+        if (results.get('startup') or {}).get('median_ms') is not None:
+            timings['startup_median'] = results['startup']['median_ms'] / 1000
+    print(f"{'phase':<18}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for phase, seconds in current_timings.items():
+        before = baseline_timings.get(phase)
+        ratio = f"{seconds / before:.2f}x" if before else "-"
+        before_text = f"{before:.4f}" if before is not None else "-"
+        print(f"{phase:<18}{before_text:>12}{seconds:>12.4f}{ratio:>8}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark main.py against a synthetic Logseq graph.")
+    parser.add_argument('--files', type=int, default=2000, help="number of markdown files (default: 2000)")
+    parser.add_argument('--blocks', type=int, default=40, help="blocks per file (default: 40)")
+    parser.add_argument('--scheduled-percent', type=float, default=5.0, help="percentage of blocks that are scheduled TODOs (default: 5)")
+    parser.add_argument('--due-now', type=int, default=20, help="scheduled blocks that fall due right away (default: 20)")
+    parser.add_argument('--tracker-history', type=int, default=10000, help="entries pre-loaded into the tracker (default: 10000)")
+    parser.add_argument('--workers', type=int, default=None, help="parse worker processes (default: CPU count)")
+    parser.add_argument('--send-workers', type=int, default=main.NTFY_SEND_WORKERS, help="concurrent senders")
+    parser.add_argument('--stub-burst', type=int, default=0, help="requests the stub server accepts in a burst (default: 0)")
+    parser.add_argument('--stub-per-second', type=float, default=0,
+                        help="requests per second the stub server accepts after a burst, answering 429 beyond that (default: 0, no limit)")
+    parser.add_argument('--no-client-rate-limit', action='store_true',
+                        help="don't match the client's rate limit to the stub's, so only 429 and Retry-After pace the sends")
+    parser.add_argument('--startup-runs', type=int, default=10, help="cold starts of main.py to time (default: 10)")
+    parser.add_argument('--startup-target-ms', type=float, default=STARTUP_TARGET_MS,
+                        help=f"median cold-start target in milliseconds (default: {STARTUP_TARGET_MS})")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the generated graph")
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    return parser.parse_args(argv)
+
+def bench_main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"Benchmark results written to {args.output}.")
+    else:
+        print(json.dumps(results, indent=4))
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+    startup = results['startup']
+    if not startup['within_target']:
+        print(f"Cold start median {startup['median_ms']} ms exceeds the {startup['target_ms']} ms target.")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(bench_main())
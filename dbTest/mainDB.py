@@ -5,8 +5,9 @@ import re
 import json
 import subprocess
 import sqlite3 # For interacting with SQLite databases
-from datetime import datetime
+from datetime import datetime, timedelta
 from socket import gethostname
+from urllib.request import pathname2url
 
 # Determine the script directory
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,6 +19,23 @@ if home_dir_alt:
 else:
     ALTERNATIVE_CONFIG_PATH = os.path.join(SCRIPT_DIR, 'alternative_config_db.json')
 
+# Logseq's native DB-graph storage is a datascript key/value table that SQL can't filter
+# by date, so the notifier reads a flattened block table. Override any of these with a
+# "db_schema" object in config_db.json.
+DEFAULT_DB_SCHEMA = {
+    "table": "blocks",
+    "id_column": "uuid",
+    "content_column": "content",
+    "marker_column": "marker",
+    "scheduled_column": "scheduled",
+    "deadline_column": "deadline",
+    "timestamp_unit": "ms",
+    "markers": ["TODO", "LATER", "NOW", "DOING"]
+}
+
+# Tasks due within this many seconds are notified
+NOTIFY_WINDOW_SECONDS = 180
+
 def create_default_config(config_path):
     """Create a default configuration file for the DB version."""
     if not os.path.exists(config_path):
@@ -144,112 +162,115 @@ def get_db_config(config):
     return config
 
 
-def fetch_tasks_from_db(db_path):
-    """
-    Fetch tasks from the Logseq SQLite database.
-    THIS IS A TEMPLATE FUNCTION. You WILL need to adapt the SQL query.
+def get_db_schema(config):
+    """Return the block-table column mapping, filling in defaults for anything not configured."""
+    schema = dict(DEFAULT_DB_SCHEMA)
+    schema.update(config.get('db_schema') or {})
+    return schema
+
+def db_schema_problem(conn, schema):
+    """Return why the database doesn't have the configured block table, or None if it does."""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+    if schema['table'] not in tables:
+        if 'kvs' in tables:
+            return (f"it is a Logseq DB graph in its native datascript storage (a 'kvs' table), which can't be "
+                    f"queried by date. Point database_path at a database with a flattened '{schema['table']}' table, "
+                    f"or set \"db_schema\" to match the table you have.")
+        return f"it has no '{schema['table']}' table. Set \"db_schema\" to match the table you have."
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({schema['table']})")}
+    wanted = [schema[name] for name in ('id_column', 'content_column', 'marker_column', 'scheduled_column', 'deadline_column')]
+    missing = [column for column in wanted if column and column not in columns]
+    if missing:
+        return f"its '{schema['table']}' table has no column {', '.join(missing)}. Set \"db_schema\" to match the table you have."
+    return None
+
+def open_db_readonly(db_path, schema=None):
+    """Open a single read-only connection to the graph database, or return None if it can't be opened.
+
+    With a schema, a database that doesn't have the configured block table is refused as well.
     """
-    tasks = []
     if not db_path or not os.path.exists(db_path):
         print(f"Error: Database path '{db_path}' is invalid or file does not exist.")
-        return tasks
-
+        return None
     try:
-        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True) # Read-only connection
-        cursor = conn.cursor()
-
-        # --- IMPORTANT ---
-        # The following SQL query is a GUESS. You need to replace it with the
-        # correct query based on Logseq's actual database schema.
-        # You'll need to find out:
-        # 1. Which table stores tasks (e.g., 'tasks', 'blocks', 'items').
-        # 2. The column name for the task description/content.
-        # 3. How scheduled dates/times are stored (e.g., a dedicated column, a property in a JSON field).
-        # 4. How to identify tasks that are "TODO" or "SCHEDULED".
-        #
-        # Example placeholder query:
-        # Assume tasks are in a 'blocks' table, content in 'content' or 'properties' (JSON),
-        # and scheduled info might be parsed from 'content' or a specific property.
-        # This query likely needs significant changes.
-        #
-        # A more realistic approach might involve looking for blocks with "SCHEDULED:"
-        # or specific task markers if they are stored similarly to markdown.
-        # Or, there might be dedicated columns like `is_task`, `status`, `scheduled_at_timestamp`.
-        #
-        # For instance, if tasks have a 'scheduled' timestamp column (unix epoch) and a 'content' column:
-        # query = """
-        # SELECT uuid, content, scheduled -- Replace 'uuid', 'content', 'scheduled' with actual column names
-        # FROM blocks -- Replace 'blocks' with the actual table name
-        # WHERE status = 'TODO' AND scheduled IS NOT NULL;
-        # """
-        #
-        # If scheduled info is in a text property you need to parse:
-        query = """
-        SELECT id, content_field, scheduled_at_field -- REPLACE THESE with actual column names
-        FROM your_task_table -- REPLACE THIS with the actual table name
-        WHERE task_status_field = 'TODO' -- REPLACE THIS with actual status check
-          AND (scheduled_at_field IS NOT NULL OR content_field LIKE '%SCHEDULED:%'); -- Example condition
-        """
-        print(f"Executing placeholder query (NEEDS REVIEW): {query} on DB: {db_path}")
-        # cursor.execute(query)
-        # rows = cursor.fetchall()
-        # For now, returning an empty list as the query is a placeholder
-        rows = [] 
-        print("Placeholder query executed. No actual data fetched as schema is unknown.")
-
-
-        # Process rows if the query were real
-        # for row in rows:
-        #     task_id_from_db = str(row[0]) # Example: first column is a unique ID
-        #     task_content = row[1]         # Example: second column is the task text
-        #     scheduled_info = row[2]       # Example: third column has schedule data
-            
-        #     scheduled_dt_obj = None
-        #     # You'll need robust parsing for scheduled_info from the DB
-        #     # This is highly dependent on how it's stored.
-        #     # For example, if it's a UNIX timestamp:
-        #     # if isinstance(scheduled_info, (int, float)):
-        #     #    scheduled_dt_obj = datetime.fromtimestamp(scheduled_info)
-        #     # If it's a string like "YYYY-MM-DD HH:MM":
-        #     # try:
-        #     #    scheduled_dt_obj = datetime.strptime(scheduled_info, '%Y-%m-%d %H:%M')
-        #     # except (ValueError, TypeError):
-        #     #    pass # Handle cases where parsing fails
-
-        #     # If scheduled info is embedded in task_content like Markdown:
-        #     # date_match = re.search(r"SCHEDULED:.*?<(\d{4}-\d{2}-\d{2})", task_content)
-        #     # time_match = re.search(r"(\d{2}:\d{2})", task_content) # Within the SCHEDULED part
-        #     # if date_match:
-        #     #     s_date_str = date_match.group(1)
-        #     #     s_time_str = time_match.group(1) if time_match else "00:00"
-        #     #     try:
-        #     #         scheduled_dt_obj = datetime.strptime(f'{s_date_str} {s_time_str}', '%Y-%m-%d %H:%M')
-        #     #     except ValueError:
-        #     #         print(f"Could not parse SCHEDULED from DB content: {task_content}")
-
-
-        #     if task_content and scheduled_dt_obj:
-        #         # Create a unique ID for notification tracking
-        #         # Using the DB's own task ID is best if available and persistent
-        #         unique_event_id = f"db_task_{task_id_from_db}_{scheduled_dt_obj.strftime('%Y%m%d%H%M')}"
-        #         tasks.append({
-        #             'description': task_content,
-        #             'datetime': scheduled_dt_obj,
-        #             'id': unique_event_id 
-        #         })
-        #     elif task_content and not scheduled_dt_obj:
-        #         print(f"Task '{task_content[:50]}' found but no valid schedule info could be parsed/found from DB row: {row}")
+        conn = sqlite3.connect('file:' + pathname2url(os.path.abspath(db_path)) + '?mode=ro', uri=True)
+    except sqlite3.Error as e:
+        print(f"SQLite error when connecting to DB at '{db_path}': {e}")
+        return None
+    try:
+        conn.execute("PRAGMA query_only = ON")
+        problem = db_schema_problem(conn, schema) if schema is not None else None
+    except sqlite3.Error as e:
+        problem = f"SQLite error: {e}"
+    if problem is not None:
+        print(f"Error: Can't read tasks from '{db_path}': {problem}")
+        conn.close()
+        return None
+    return conn
 
+def build_task_window_query(schema):
+    """Build the time-window query for the configured schema.
 
-        conn.close()
+    Each timestamp column gets its own range predicate joined by UNION ALL, so SQLite
+    can answer both halves from an index on that column instead of scanning blocks.
+    """
+    marker_placeholders = ", ".join("?" for _ in schema['markers'])
+    selects = []
+    for kind, column in (('SCHEDULED', schema['scheduled_column']), ('DEADLINE', schema['deadline_column'])):
+        if not column:
+            continue
+        selects.append(
+            f"SELECT {schema['id_column']}, {schema['content_column']}, '{kind}', {column} "
+            f"FROM {schema['table']} "
+            f"WHERE {column} >= ? AND {column} <= ? AND {schema['marker_column']} IN ({marker_placeholders})"
+        )
+    return " UNION ALL ".join(selects)
+
+def warn_if_unindexed(conn, query, parameters):
+    """Print a warning when SQLite would answer the window query with a full table scan."""
+    try:
+        for row in conn.execute("EXPLAIN QUERY PLAN " + query, parameters):
+            detail = row[-1]
+            if detail.startswith('SCAN') and 'INDEX' not in detail:
+                print(f"Warning: DB window query does a full table scan ({detail}). "
+                      "Add an index on the scheduled/deadline columns for fast lookups.")
+                return
     except sqlite3.Error as e:
-        print(f"SQLite error when connecting or querying DB at '{db_path}': {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred in fetch_tasks_from_db: {e}")
-    
-    if not tasks:
-        print("No tasks fetched from DB (or placeholder query returned none). Check DB path, schema, and SQL query.")
-    return tasks
+        print(f"Could not inspect DB query plan: {e}")
+
+def fetch_tasks_from_db(conn, schema, window_start, window_end):
+    """
+    Yield tasks whose scheduled/deadline timestamp falls inside [window_start, window_end].
+
+    Rows are streamed from the cursor rather than fetched all at once, so memory use
+    doesn't depend on how many tasks fall inside the window. A failing query raises
+    sqlite3.Error, so the caller can tell an unreadable graph from an empty window.
+    """
+    scale = 1000 if schema['timestamp_unit'] == 'ms' else 1
+    query = build_task_window_query(schema)
+    parameters = []
+    for _ in range(query.count(" UNION ALL ") + 1):
+        parameters.extend([int(window_start.timestamp() * scale), int(window_end.timestamp() * scale)])
+        parameters.extend(schema['markers'])
+    warn_if_unindexed(conn, query, parameters)
+
+    cursor = conn.execute(query, parameters)
+    for task_id_from_db, task_content, kind, timestamp in cursor:
+        if not task_content or timestamp is None:
+            continue
+        scheduled_dt_obj = datetime.fromtimestamp(timestamp / scale)
+        # Block content starts with its marker, e.g. "TODO Call Bob"; show just the text.
+        description = task_content.split('\n', 1)[0]
+        for marker in schema['markers']:
+            if description.startswith(marker + ' '):
+                description = description[len(marker) + 1:]
+                break
+        prefix = "db_task" if kind == 'SCHEDULED' else "db_deadline"
+        yield {
+            'description': description.strip(),
+            'datetime': scheduled_dt_obj,
+            'id': f"{prefix}_{task_id_from_db}_{scheduled_dt_obj.strftime('%Y%m%d%H%M')}"
+        }
 
 # --- Utility functions (send_ntfy_notification, should_send_notification, truncate_task_description) ---
 # These can be largely the same as in the Markdown version, so I'll include them for completeness.
@@ -361,35 +382,33 @@ def main():
 
         now = datetime.now()
         
-        # Fetch tasks from the database
-        # THIS IS WHERE THE CORE LOGIC CHANGES FROM THE MARKDOWN VERSION
-        tasks_from_db = fetch_tasks_from_db(db_file_path)
-        
-        if not tasks_from_db:
-            print("No tasks retrieved from the database. Ensure DB path is correct and `fetch_tasks_from_db` is properly implemented.")
-        else:
-            print(f"Retrieved {len(tasks_from_db)} tasks from DB (after parsing).")
-
-
-        for event in tasks_from_db:
-            original_task_desc = event['description']
-            scheduled_date_time_obj = event['datetime']
-            task_id = event['id']
-        
-            if scheduled_date_time_obj:
-                time_difference_seconds = (scheduled_date_time_obj - now).total_seconds()
-                
-                if 0 <= time_difference_seconds <= 180: # Notify if due within 3 minutes
-                    print(f"DB Task '{original_task_desc[:50]}...' scheduled for {scheduled_date_time_obj.strftime('%Y-%m-%d %H:%M')} is due soon.")
-                    if should_send_notification(notification_tracker_file, task_id):
-                        ntfy_title_header = 'Task Reminder (DB)'
-                        notif_body_desc = truncate_task_description(original_task_desc, 100)
-                        details_for_body = f"{notif_body_desc} is due at {scheduled_date_time_obj.strftime('%H:%M')}!"
-                        ntfy_message_body = f"Task Reminder: {details_for_body}"
-                        
-                        send_ntfy_notification(ntfy_topic, ntfy_title_header, ntfy_message_body, priority="high", tags="alarm_clock,database")
-                    else:
-                        print(f"Notification for DB task ID {task_id} already sent or failed to mark.")
+        # Fetch only the tasks due inside the notification window, over one read-only connection
+        schema = get_db_schema(paths_config)
+        conn = open_db_readonly(db_file_path, schema)
+        if conn is None:
+            return 1
+        tasks_retrieved = 0
+        try:
+            window_end = now + timedelta(seconds=NOTIFY_WINDOW_SECONDS)
+            for event in fetch_tasks_from_db(conn, schema, now, window_end):
+                tasks_retrieved += 1
+                original_task_desc = event['description']
+                scheduled_date_time_obj = event['datetime']
+                task_id = event['id']
+
+                print(f"DB Task '{original_task_desc[:50]}...' scheduled for {scheduled_date_time_obj.strftime('%Y-%m-%d %H:%M')} is due soon.")
+                if should_send_notification(notification_tracker_file, task_id):
+                    ntfy_title_header = 'Task Reminder (DB)'
+                    notif_body_desc = truncate_task_description(original_task_desc, 100)
+                    details_for_body = f"{notif_body_desc} is due at {scheduled_date_time_obj.strftime('%H:%M')}!"
+                    ntfy_message_body = f"Task Reminder: {details_for_body}"
+
+                    send_ntfy_notification(ntfy_topic, ntfy_title_header, ntfy_message_body, priority="high", tags="alarm_clock,database")
+                else:
+                    print(f"Notification for DB task ID {task_id} already sent or failed to mark.")
+        finally:
+            conn.close()
+        print(f"Retrieved {tasks_retrieved} tasks due in the next {NOTIFY_WINDOW_SECONDS} seconds from DB.")
         
         print("--- DB Script finished processing. ---")
         actual_exit_code = 0
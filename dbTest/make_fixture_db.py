@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Generate a fixture DB graph for mainDB.py.
+
+Writes a flattened block table in the layout mainDB.py expects (see DEFAULT_DB_SCHEMA)
+with the given number of blocks. A small share are TODO-style tasks with scheduled or
+deadline timestamps spread over +/- one year; --due-now of them fall due within the
+notification window. tests/test_db_backend.py runs the window query over such a fixture.
+
+    python3 dbTest/make_fixture_db.py fixture.sqlite --blocks 500000
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+MARKERS = ["TODO", "LATER", "NOW", "DOING", "DONE", "CANCELED"]
+
+def create_fixture(db_path, blocks, task_percent, due_now, seed=0):
+    """Create the fixture database and return how many blocks fall due within the window."""
+    rng = random.Random(seed)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE blocks (uuid TEXT PRIMARY KEY, page TEXT, content TEXT, marker TEXT, scheduled INTEGER, deadline INTEGER)")
+    now = datetime.now()
+    due_soon = 0
+
+    def rows():
+        nonlocal due_soon
+        for index in range(blocks):
+            block_uuid = str(uuid.UUID(int=rng.getrandbits(128)))
+            page = f"Page {index // 50}"
+            if rng.random() * 100 >= task_percent:
+                yield block_uuid, page, f"Note {index} with [[links]] and prose", None, None, None
+                continue
+            marker = rng.choice(MARKERS)
+            if due_soon < due_now:
+                due = now + timedelta(seconds=60)
+                marker = "TODO"
+                due_soon += 1
+            else:
+                due = now + timedelta(days=rng.randint(-365, 365), minutes=rng.randint(0, 1439))
+            due_ms = int(due.timestamp() * 1000)
+            scheduled, deadline = (due_ms, None) if rng.random() < 0.7 else (None, due_ms)
+            yield block_uuid, page, f"{marker} Fixture task {index}", marker, scheduled, deadline
+
+    with conn:
+        conn.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)", rows())
+        conn.execute("CREATE INDEX blocks_scheduled_idx ON blocks (scheduled) WHERE scheduled IS NOT NULL")
+        conn.execute("CREATE INDEX blocks_deadline_idx ON blocks (deadline) WHERE deadline IS NOT NULL")
+    conn.execute("ANALYZE")
+    conn.close()
+    return due_soon
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a fixture DB graph for mainDB.py.")
+    parser.add_argument('db_path', help="where to write the fixture database")
+    parser.add_argument('--blocks', type=int, default=300000, help="number of blocks (default: 300000)")
+    parser.add_argument('--task-percent', type=float, default=10.0, help="percentage of blocks that carry a timestamp (default: 10)")
+    parser.add_argument('--due-now', type=int, default=5, help="tasks due within the notification window (default: 5)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    return parser.parse_args(argv)
+
+def fixture_main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+    due_soon = create_fixture(args.db_path, args.blocks, args.task_percent, args.due_now, args.seed)
+    print(f"Wrote {args.blocks} blocks to {args.db_path} in {time.perf_counter() - start:.1f} s ({due_soon} due now).")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(fixture_main())
@@ -1,10 +1,21 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import re
 import json
-import subprocess
-from datetime import datetime
+import time
+import heapq
+import itertools
+import select
+import struct
+import mmap
+import bisect
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+# sqlite3, hashlib, calendar, subprocess and http.client are imported where they are
+# used: most cron runs need none of them, and together they dominate import time.
 # from socket import gethostname # Not strictly needed anymore for path logic
 
 # --- Constants ---
@@ -16,13 +27,285 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 IS_TERMUX = "com.termux" in os.getenv("PREFIX", "")
 
 # Path for user-specific configuration (preferred on PC)
-USER_CONFIG_DIR_PC = os.path.join(os.path.expanduser("~"), 'logseq', 'graphs', 'Omni', 'assets'
+USER_CONFIG_DIR_PC = os.path.join(os.path.expanduser("~"), 'logseq', 'graphs', 'Omni', 'assets')
 USER_CONFIG_PATH_PC = os.path.join(USER_CONFIG_DIR_PC, CONFIG_FILE_NAME)
 
 # Path for configuration local to the script (fallback or for Termux/portable use)
 LOCAL_CONFIG_PATH = os.path.join(SCRIPT_DIR, CONFIG_FILE_NAME)
+
+# Where the resolved config location is remembered between runs
+CONFIG_LOCATION_CACHE_FILE = os.path.join(os.path.expanduser("~"), '.cache', APP_NAME, 'config_location')
+
+# Progress output is off by default so cron runs stay quiet (errors are always printed)
+VERBOSE = bool(os.getenv("LOGSEQ_NOTIFY_VERBOSE"))
+
+# Graph-root mode: sub-directories of a Logseq graph that hold markdown pages
+GRAPH_SCAN_DIRS = ('pages', 'journals')
+# Below this many files a process pool costs more to start than it saves
+PARALLEL_SCAN_MIN_FILES = 64
+# Per-file parse cache kept in output_dir; bump the version whenever the cached event format changes
+PARSE_CACHE_FILE_NAME = "parse_cache_markdown.json"
+PARSE_CACHE_VERSION = 7
+# An edited block without matching due times keeps its old key if its description is at least this similar
+BLOCK_MATCH_MIN_SIMILARITY = 0.6
+# A block with the same due times as a vanished one may be reworded more freely, but not be a different task
+BLOCK_MATCH_SCHEDULE_MIN_SIMILARITY = 0.4
+BLOCK_MATCH_MAX_COMPARISONS = 10000
+# Files whose tasks are all past the catch-up window are kept in the cache without their events.
+# Journal pages dated at least this many days ago are then not even checked for edits,
+# except on one full check per day.
+JOURNAL_SETTLED_DAYS = 30
+JOURNAL_RECHECK_SECONDS = 86400
+
+# DB-graph profiles (those with a "database_path") are read through dbTest/mainDB.py
+DB_BACKEND_DIR = os.path.join(SCRIPT_DIR, 'dbTest')
+
+# Files at least this large are memory-mapped rather than read; mmaps are scanned in chunks of this size
+MMAP_MIN_FILE_BYTES = 256 * 1024
+MMAP_SCAN_CHUNK_BYTES = 1024 * 1024
+# How far back to look for the start of the block around a SCHEDULED/DEADLINE line
+MAX_BLOCK_LOOKBACK_BYTES = 64 * 1024
+
+# ntfy transport: default server, concurrent senders, per-request timeout and retry schedule
+NTFY_DEFAULT_SERVER = "https://ntfy.sh"
+NTFY_SEND_WORKERS = 4
+NTFY_TIMEOUT_SECONDS = 15
+NTFY_MAX_ATTEMPTS = 4
+NTFY_BACKOFF_SECONDS = 1.0
+# Client-side rate limit per topic and server, ntfy.sh's defaults: a burst of 60, then one request
+# every 5 s (config: "rate_limit"). A message that would have to wait longer than the maximum for
+# its turn, or for a 429's Retry-After, stays in the outbox until then.
+NTFY_RATE_LIMIT_BURST = 60
+NTFY_RATE_LIMIT_PER_SECOND = 0.2
+NTFY_RATE_LIMIT_MAX_WAIT_SECONDS = 60
+
+# Digest mode: events due in the same window are coalesced into one message of at most this many tasks
+DIGEST_WINDOW_SECONDS = 300
+DIGEST_MAX_ITEMS = 10
+
+# Tracker entries older than this are expired (config: tracker_retention_days)
+TRACKER_RETENTION_DAYS = 90
+
+# Outbox: due notifications are stored first and only count as sent after a 2xx. Each delivery
+# pass tries a message this many times; after that it is retried later with doubling delays,
+# and given up once it has been queued for longer than the maximum age.
+OUTBOX_SEND_ATTEMPTS = 2
+OUTBOX_RETRY_SECONDS = 30
+OUTBOX_MAX_RETRY_SECONDS = 3600
+OUTBOX_MAX_AGE_SECONDS = 86400
+# Messages a run picks up for sending are claimed for this long, so an overlapping run skips them
+OUTBOX_CLAIM_SECONDS = 300
+
+# Single-instance guard per profile (a lock file in output_dir). A run that finds another one still
+# busy skips the profile, unless that run started so long ago that it is presumably hung.
+RUN_LOCK_FILE_NAME = "run_markdown.lock"
+RUN_LOCK_STALE_SECONDS = 600
+
+# Events due within this many seconds are notified
+NOTIFY_WINDOW_SECONDS = 300
+# Each run also catches up on reminders since the last run (kept in this file in output_dir),
+# sending those no older than the grace period as "missed" (config: missed_grace_seconds)
+WATERMARK_FILE_NAME = "last_run_markdown.json"
+MISSED_GRACE_SECONDS = 3600
+# Upcoming-schedule snapshot for other apps (config: "snapshot"), written to output_dir only when it changes
+SNAPSHOT_JSON_FILE_NAME = "upcoming_markdown.json"
+SNAPSHOT_ICS_FILE_NAME = "upcoming_markdown.ics"
+SNAPSHOT_DAYS = 7
+SNAPSHOT_MAX_ITEMS = 100
+# Lead-time units for "lead_times", "tag_lead_times" and remind:: properties
+LEAD_TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# Metrics export (config: "metrics"): one JSON line per run, or a Prometheus textfile, in output_dir
+METRICS_JSONL_FILE_NAME = "metrics_markdown.jsonl"
+METRICS_PROMETHEUS_FILE_NAME = "metrics_markdown.prom"
+METRICS_PREFIX = "logseq_notify"
+# --profile: rows per ranking in the printed report, and the raw cProfile dump kept in output_dir
+PROFILE_REPORT_ROWS = 15
+PROFILE_STATS_FILE_NAME = "profile_markdown.pstats"
+
+# Daemon query API (config: "query_api"): reminders this far ahead are indexed, and the index is
+# rebuilt at least this often so the window keeps moving; queries return at most this many reminders
+QUERY_API_INDEX_DAYS = 7
+QUERY_API_REFRESH_SECONDS = 3600
+QUERY_API_MAX_ITEMS = 100
+# Daemon mode: fallback polling interval, longest single sleep, and debounce after a file change
+DAEMON_POLL_SECONDS = 30
+DAEMON_MAX_SLEEP_SECONDS = 3600
+DAEMON_CHANGE_SETTLE_SECONDS = 0.5
+# Daemon mode: wait before retrying due reminders that could not be written to the outbox
+DAEMON_QUEUE_RETRY_SECONDS = 60
+# inotify: IN_NONBLOCK | IN_CLOEXEC; IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_FLAGS = 0o4000 | 0o2000000
+INOTIFY_WATCH_MASK = 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
 # --- End Constants ---
 
+# Markdown block parser: task markers that can be notified, and SCHEDULED/DEADLINE timestamps
+_TASK_RE = re.compile(r'(TODO|LATER|NOW|DOING)\s+(.+)')
+_TASK_INITIALS = frozenset('TLND')
+# Repeater cookies: +1w, ++1m and .+1d all repeat every interval from the written date
+_TIMESTAMP_RE = re.compile(r'(SCHEDULED|DEADLINE):\s*<(\d{4})-(\d{2})-(\d{2})(?:\s+[^\s\d>.+]+)?(?:\s+(\d{1,2}):(\d{2}))?(?:\s+(?:\.\+|\+\+|\+)(\d+)([hdwmy]))?[^>]*>')
+_ID_UNSAFE_RE = re.compile(r'[^\w\s-]')
+_LEAD_TIME_RE = re.compile(r'(\d+)\s*([smhdw])?')
+_JOURNAL_PAGE_RE = re.compile(r'journals/(\d{4})_(\d{2})_(\d{2})$')
+_PRIORITY_RE = re.compile(r'\[#([ABCabc])\]')
+# Like Logseq, a # only starts a tag at the start of the text or after whitespace, not in URLs or words
+_TAG_RE = re.compile(r'(?<!\S)#(?:([\w/-]+)|\[\[([^\]]+)\]\])')
+_BLOCK_CONTINUATION_PREFIXES = ('SCHEDULED:', 'DEADLINE:', ':LOGBOOK:', 'CLOCK:', ':END:')
+_BLOCK_CONTINUATION_PREFIXES_BYTES = tuple(prefix.encode('ascii') for prefix in _BLOCK_CONTINUATION_PREFIXES)
+
+# Persistent ntfy connections, one per server per sender thread
+_ntfy_thread_state = threading.local()
+_ntfy_all_connections = []
+_ntfy_connections_lock = threading.Lock()
+_ntfy_send_pool = None
+
+# Token buckets per (server, topic), and the (burst, per_second) new ones get; see configure_rate_limit()
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+_rate_limit = (NTFY_RATE_LIMIT_BURST, NTFY_RATE_LIMIT_PER_SECOND)
+
+# Tie-breaker for daemon heap entries that share a notify time
+_heap_sequence = itertools.count()
+
+# Phase timings and counters of the current run (see RunMetrics)
+_run_metrics = None
+
+def log(message):
+    """Print progress output; quiet unless --verbose or LOGSEQ_NOTIFY_VERBOSE is set. Errors use print()."""
+    if VERBOSE:
+        print(message)
+
+def _replace_file(path, content):
+    """Write a file via a temp file of this process and a rename, so readers and overlapping runs never see half of it."""
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        os.replace(temp_file, path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+class FileLock:
+    """Exclusive advisory lock (fcntl.flock) on a lock file, held against other processes and other threads.
+
+    Re-entrant within a thread. The kernel drops the lock when its holder exits, so a
+    crashed run never leaves it behind. Where fcntl doesn't exist (Windows) only the
+    thread lock is taken.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self._depth = 0
+        self._thread_lock = threading.RLock()
+
+    def acquire(self, blocking=True):
+        """Take the lock; without blocking, return False at once if another process or thread holds it."""
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth:
+            self._depth += 1
+            return True
+        try:
+            lock_file = open(self.path, 'a+', encoding='utf-8')
+        except OSError:
+            self._thread_lock.release()
+            raise
+        try:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except ImportError:
+            pass
+        except BlockingIOError:
+            lock_file.close()
+            self._thread_lock.release()
+            return False
+        except BaseException:
+            # EINTR, ENOLCK or EBADF (some FUSE and shared-storage mounts): don't keep the thread lock, or every other thread waits forever.
+            lock_file.close()
+            self._thread_lock.release()
+            raise
+        self.file = lock_file
+        self._depth = 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if not self._depth:
+            # Closing the file drops the flock.
+            self.file.close()
+            self.file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+class RunMetrics:
+    """Durations per phase, counters and send latencies of one run.
+
+    Phases that run in several threads or worker processes at once (reading the
+    profiles' sources, parsing) add up, so they can exceed the run's wall time.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases = {}
+        self.counts = {}
+        self.send_latencies = []
+        # (path, seconds, peak allocated bytes, lines) per file read; only collected under --profile
+        self.file_costs = None
+        self._lock = threading.Lock()
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def phase(self, name):
+        """Return a context manager that adds the time spent inside it to the named phase."""
+        return _PhaseTimer(self, name)
+
+    def latency_summary(self):
+        latencies = sorted(self.send_latencies)
+        if not latencies:
+            return {'count': 0}
+        def quantile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+        return {'count': len(latencies), 'mean': sum(latencies) / len(latencies),
+                'p50': quantile(0.5), 'p95': quantile(0.95), 'max': latencies[-1]}
+
+class _PhaseTimer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+def run_metrics():
+    """Return the metrics of the current run, starting a fresh set if there is none yet."""
+    global _run_metrics
+    if _run_metrics is None:
+        _run_metrics = RunMetrics()
+    return _run_metrics
+
 def create_default_config(config_path, is_termux_env):
     """Create a default configuration file if it doesn't exist."""
     if not os.path.exists(config_path):
@@ -31,6 +314,7 @@ def create_default_config(config_path, is_termux_env):
             "paths": {
                 "default": {
                     "markdown": "",
+                    "graph_root": "",
                     "output_dir": "",
                     "notification_tracker": "",
                     "ntfy_topic": ""
@@ -51,25 +335,61 @@ def create_default_config(config_path, is_termux_env):
             default_config["paths"]["default"]["output_dir"] = os.path.join(home_dir, 'logseq', 'graphs', 'Omni', 'assets')
         
         try:
-            os.makedirs(os.path.dirname(config_path), exist_ok=True)
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=4)
+            if os.path.dirname(config_path):
+                os.makedirs(os.path.dirname(config_path), exist_ok=True)
+            _replace_file(config_path, json.dumps(default_config, indent=4))
             print(f'Default configuration file created at {config_path}. Please review and update it, especially the "markdown" path if it is empty or "Omni"/"YourGraphName" is not your graph name or paths differ.')
         except IOError as e:
             print(f"Error creating default configuration file {config_path}: {e}")
     else:
-        print(f"Configuration file already exists at {config_path}.")
+        log(f"Configuration file already exists at {config_path}.")
+
+def _read_cached_config_location():
+    """Return the config path remembered by an earlier run, if it still exists."""
+    try:
+        with open(CONFIG_LOCATION_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cached_path = f.read().strip()
+    except (IOError, OSError):
+        return None
+    return cached_path if cached_path and os.path.isfile(cached_path) else None
 
-def load_config():
-    """Load configuration from the JSON file, preferring PC user path then local path."""
+def _write_cached_config_location(config_path):
+    """Remember where the config was found so later runs can skip the search."""
+    try:
+        os.makedirs(os.path.dirname(CONFIG_LOCATION_CACHE_FILE), exist_ok=True)
+        _replace_file(CONFIG_LOCATION_CACHE_FILE, os.path.abspath(config_path))
+    except (IOError, OSError) as e:
+        log(f"Could not cache config location in {CONFIG_LOCATION_CACHE_FILE}: {e}")
+
+def load_config(config_override=None):
+    """Load configuration from the JSON file; returns (config, config_path), or (None, None)."""
+    config_path = locate_config(config_override)
+    if config_path is None:
+        return None, None
+    config = read_config(config_path)
+    return (config, config_path) if config is not None else (None, None)
+
+def locate_config(config_override=None):
+    """Find the JSON config file, creating a default one if there is none; returns its path or None.
+
+    An explicit path wins. Otherwise the location found by an earlier run is reused,
+    and only if that is gone are the PC user path and then the local path searched.
+    """
     config_to_load = None
-    loaded_path = None
+    cached_path = None
 
-    if not IS_TERMUX and os.path.exists(USER_CONFIG_PATH_PC):
-        print(f"Loading Markdown config from user path: {USER_CONFIG_PATH_PC}.")
+    if config_override:
+        if not os.path.exists(config_override):
+            create_default_config(config_override, IS_TERMUX)
+        config_to_load = config_override
+    elif (cached_path := _read_cached_config_location()):
+        log(f"Loading Markdown config from cached location: {cached_path}.")
+        config_to_load = cached_path
+    elif not IS_TERMUX and os.path.exists(USER_CONFIG_PATH_PC):
+        log(f"Loading Markdown config from user path: {USER_CONFIG_PATH_PC}.")
         config_to_load = USER_CONFIG_PATH_PC
     elif os.path.exists(LOCAL_CONFIG_PATH):
-        print(f"Loading Markdown config from local script path: {LOCAL_CONFIG_PATH}.")
+        log(f"Loading Markdown config from local script path: {LOCAL_CONFIG_PATH}.")
         config_to_load = LOCAL_CONFIG_PATH
     else:
         print(f"No Markdown configuration file found at user path ('{USER_CONFIG_PATH_PC}') or local script path ('{LOCAL_CONFIG_PATH}').")
@@ -82,39 +402,48 @@ def load_config():
         create_default_config(path_to_create_at, IS_TERMUX)
 
         if os.path.exists(path_to_create_at):
-            print(f"Loading newly created Markdown configuration from: {path_to_create_at}.")
+            log(f"Loading newly created Markdown configuration from: {path_to_create_at}.")
             config_to_load = path_to_create_at
         elif not IS_TERMUX and path_to_create_at == USER_CONFIG_PATH_PC and not os.path.exists(LOCAL_CONFIG_PATH):
             print(f"Failed to create at user path, attempting to create at local script path: {LOCAL_CONFIG_PATH}")
             create_default_config(LOCAL_CONFIG_PATH, IS_TERMUX) 
             if os.path.exists(LOCAL_CONFIG_PATH):
-                print(f"Loading newly created Markdown configuration from local script path: {LOCAL_CONFIG_PATH}.")
+                log(f"Loading newly created Markdown configuration from local script path: {LOCAL_CONFIG_PATH}.")
                 config_to_load = LOCAL_CONFIG_PATH
             else:
                 print("Failed to create any Markdown configuration file.")
-                return None, None
+                return None
         else:
             print("Failed to create or find a Markdown configuration file after creation attempts.")
-            return None, None
-            
-    if config_to_load:
-        try:
-            with open(config_to_load, 'r', encoding='utf-8') as f:
-                loaded_path = config_to_load
-                return json.load(f), loaded_path
-        except Exception as e:
-            print(f"Error loading/parsing Markdown config {config_to_load}: {e}")
-            return None, None
-            
-    return None, None
+            return None
+
+    if config_to_load and not config_override and cached_path != os.path.abspath(config_to_load):
+        _write_cached_config_location(config_to_load)
+    return config_to_load
+
+def read_config(config_path):
+    """Read and parse the JSON config file, or return None after reporting why it can't be."""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading/parsing Markdown config {config_path}: {e}")
+        return None
+
+def config_lock(config_path):
+    """The lock to hold from reading the config to saving it, so overlapping runs can't lose each other's changes."""
+    return FileLock(f"{config_path}.lock")
 
 def save_config(config, config_path):
-    """Save configuration to the JSON file."""
-    print(f"Saving Markdown version configuration to {config_path}.")
+    """Save configuration to the JSON file, replacing it in one step so a crash never leaves it half-written.
+
+    Call it under config_lock(), taken before the config was read.
+    """
+    log(f"Saving Markdown version configuration to {config_path}.")
     try:
-        os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4)
+        if os.path.dirname(config_path):
+            os.makedirs(os.path.dirname(config_path), exist_ok=True)
+        _replace_file(config_path, json.dumps(config, indent=4))
     except IOError as e:
         print(f"Error saving Markdown version configuration to {config_path}: {e}")
 
@@ -134,7 +463,7 @@ def prompt_for_paths(paths_config_section, is_termux_env):
         default_output_dir = os.path.join(home_dir, 'logseq', 'graphs', 'Omni', 'assets')
 
 
-    if not paths_config_section.get('markdown'):
+    if not paths_config_section.get('markdown') and not paths_config_section.get('graph_root'):
         prompt_message = "Enter Logseq Markdown file path"
         if default_markdown_path:
             prompt_message += f" (default: {default_markdown_path})"
@@ -176,8 +505,8 @@ def get_task_file_paths(config, is_termux_env):
     paths_section = config['paths']['default']
     
     essential_paths_missing = False
-    if not paths_section.get('markdown'):
-        print("Markdown file path is missing.")
+    if not paths_section.get('markdown') and not paths_section.get('graph_root') and not paths_section.get('database_path'):
+        print("Markdown file path (or graph_root) is missing.")
         essential_paths_missing = True
     if not paths_section.get('output_dir'):
         print("Output directory path is missing.")
@@ -192,79 +521,1366 @@ def get_task_file_paths(config, is_termux_env):
 
     if paths_section.get('output_dir') and not paths_section.get('notification_tracker'):
         paths_section['notification_tracker'] = os.path.join(paths_section['output_dir'], 'notification_tracker_markdown.txt')
-        print(f"Derived Notification tracker path: {paths_section['notification_tracker']}")
+        log(f"Derived Notification tracker path: {paths_section['notification_tracker']}")
 
     return paths_section
 
-def parse_task_line(line):
-    """Extract task description from a line. Handles TODO and - TODO."""
-    match = re.match(r"-\s*TODO\s+(.+)|TODO\s+(.+)", line, re.IGNORECASE)
-    if match:
-        return match.group(1).strip() if match.group(1) else match.group(2).strip()
-    return None
-
-def parse_scheduled_line(line):
-    """Extract date and time from a scheduling line."""
-    schedule_match = re.search(r"SCHEDULED:.*?<(\d{4}-\d{2}-\d{2})[^>]*?(\d{2}:\d{2})?>", line, re.IGNORECASE)
-    if schedule_match:
-        scheduled_date = schedule_match.group(1)
-        scheduled_time = schedule_match.group(2) if schedule_match.group(2) else "00:00"
-        return scheduled_date, scheduled_time
-    return None, None
-
-def send_ntfy_notification(topic, title, body, priority="default", tags=None):
-    """Send a notification using ntfy.sh via curl."""
-    if not topic:
-        print("Error: ntfy.sh topic is not configured. Cannot send notification.")
-        return
-    ntfy_server = "https://ntfy.sh"
-    full_topic_url = f"{ntfy_server}/{topic}"
-    print(f"Sending ntfy notification to topic '{topic}' with title: '{title}' and body: '{body}'.")
-    command = ['curl', '-X', 'POST']
+def get_profiles(config, is_termux_env, selected_names=None):
+    """Return {name: paths section} for every profile under 'paths', or only the selected ones.
+
+    Only the default profile is prompted for; other profiles must be complete in the
+    config file. Each gets its own tracker file unless one is configured.
+    """
+    if not config.get('paths') or 'default' in config['paths']:
+        if not selected_names or 'default' in selected_names:
+            get_task_file_paths(config, is_termux_env)
+    profiles = {}
+    for name, paths_section in (config.get('paths') or {}).items():
+        if selected_names and name not in selected_names:
+            continue
+        if name != 'default' and paths_section.get('output_dir') and not paths_section.get('notification_tracker'):
+            paths_section['notification_tracker'] = os.path.join(paths_section['output_dir'], f'notification_tracker_{name}.txt')
+            log(f"Derived Notification tracker path for profile '{name}': {paths_section['notification_tracker']}")
+        profiles[name] = paths_section
+    for name in selected_names or ():
+        if name not in profiles:
+            print(f"Profile '{name}' is not configured under 'paths'.")
+    return profiles
+
+class TaskRecord:
+    """One SCHEDULED or DEADLINE timestamp of a task block.
+
+    repeat is None or (count, unit) from a repeater cookie such as .+1d; key is the
+    event ID without its timestamp, so every occurrence of a repeating task gets
+    its own ID. leads holds the lead times of a remind:: block property, if any.
+    """
+    __slots__ = ('page', 'line', 'depth', 'marker', 'kind', 'due', 'repeat', 'description', 'key', 'leads')
+
+    def __init__(self, page, line, depth, marker, kind, due, repeat, description, key, leads=None):
+        self.page = page
+        self.line = line
+        self.depth = depth
+        self.marker = marker
+        self.kind = kind
+        self.due = due
+        self.repeat = repeat
+        self.description = description
+        self.key = key
+        self.leads = leads
+
+    @property
+    def datetime(self):
+        return datetime.fromtimestamp(self.due)
+
+    @property
+    def id(self):
+        return f"{self.key}_{self.datetime:%Y%m%d%H%M}"
+
+    def at(self, due):
+        """Return a copy of this record moved to another occurrence."""
+        return TaskRecord(self.page, self.line, self.depth, self.marker, self.kind, due, self.repeat, self.description, self.key, self.leads)
+
+    def to_list(self):
+        return [self.page, self.line, self.depth, self.marker, self.kind, self.due, self.repeat, self.description, self.key, self.leads]
+
+    def __repr__(self):
+        return f"TaskRecord({self.marker} {self.description!r} {self.kind} {self.datetime:%Y-%m-%d %H:%M} at {self.page or 'markdown'}:{self.line})"
+
+def _add_months(moment, months):
+    """Shift a datetime by whole months, clamping the day to the length of the target month."""
+    import calendar
+    month_index = moment.month - 1 + months
+    year, month = moment.year + month_index // 12, month_index % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+def next_occurrence(due, repeat, not_before):
+    """Return the first occurrence of a (possibly repeating) timestamp at or after not_before.
+
+    The number of elapsed intervals is computed arithmetically, so a daily task
+    written years ago costs the same as a new one. Day-based and longer repeaters
+    step in local wall-clock time, so 09:00 stays 09:00 across DST changes.
+    """
+    if not repeat or due >= not_before:
+        return due
+    count, unit = repeat
+    if count <= 0:
+        return due
+    if unit == 'h':
+        period = count * 3600
+        return due + -(-(not_before - due) // period) * period
+
+    base = datetime.fromtimestamp(due)
+    target = datetime.fromtimestamp(not_before)
+    if unit in ('d', 'w'):
+        period_days = count * (7 if unit == 'w' else 1)
+        intervals = (target.date() - base.date()).days // period_days
+        candidate = base + timedelta(days=intervals * period_days)
+        if candidate.timestamp() < not_before:
+            candidate += timedelta(days=period_days)
+        return candidate.timestamp()
+
+    period_months = count * (12 if unit == 'y' else 1)
+    intervals = ((target.year - base.year) * 12 + target.month - base.month) // period_months
+    candidate = _add_months(base, intervals * period_months)
+    if candidate.timestamp() < not_before:
+        candidate = _add_months(base, (intervals + 1) * period_months)
+    return candidate.timestamp()
+
+def upcoming_occurrence(record, not_before):
+    """Return the record itself, or for a repeating task a copy moved to its next occurrence at or after not_before."""
+    if not record.repeat or record.due >= not_before:
+        return record
+    return record.at(next_occurrence(record.due, record.repeat, not_before))
+
+def parse_lead_times(values):
+    """Return sorted lead times in seconds from "1d, 1h, 5m" or a list of such items; bare numbers are seconds."""
+    if isinstance(values, str):
+        values = values.split(',')
+    leads = set()
+    for value in values:
+        value = str(value).strip()
+        match = _LEAD_TIME_RE.fullmatch(value)
+        if match is None:
+            if value:
+                print(f"Warning: Ignoring lead time '{value}' (use e.g. 1d, 2h, 15m or seconds).")
+            continue
+        leads.add(int(match.group(1)) * LEAD_TIME_UNITS[match.group(2) or 's'])
+    return tuple(sorted(leads))
+
+def event_tags(description):
+    """Return the lower-cased #tags and #[[tags]] of a task description."""
+    return {(tag or bracketed).lower() for tag, bracketed in _TAG_RE.findall(description)}
+
+def task_priority(description):
+    """Return the Logseq priority (A, B or C) of a task description, or None."""
+    if '[#' not in description:
+        return None
+    match = _PRIORITY_RE.search(description)
+    return match.group(1).upper() if match else None
+
+def page_name(page):
+    """Return the lower-cased name rules match a page by, the one Logseq shows.
+
+    pages/Work.md is "work"; namespaced pages/Projects___Alpha.md and the older
+    pages/Projects%2FAlpha.md are both "projects/alpha". Journals keep their folder.
+    """
+    page = (page or '').lower()
+    if page.startswith('journals/'):
+        return page
+    if page.startswith('pages/'):
+        page = page[6:]
+    page = page.replace('___', '/')
+    if '%' in page:
+        from urllib.parse import unquote
+        page = unquote(page)
+    return page
+
+class NotificationRules:
+    """A profile's "rules", compiled into lookup tables keyed by tag, priority and page.
+
+    A rule's "match" may name a tag, a priority and a page, all of which must hold;
+    it sets any of "topic", "priority", "tags", "lead_times" and "suppress". Every
+    matching rule applies in order, so later rules override earlier ones. An event
+    only checks the rules filed under its own page, tags and priority, and the merged
+    settings are memoized per (page, tags, priority), so the cost per event stays flat
+    however many rules and events there are.
+    """
+    __slots__ = ('rules', 'by_page', 'by_tag', 'by_priority', 'match_all', 'max_lead', '_settings_cache')
+
+    def __init__(self, rule_configs):
+        self.rules = []
+        self.by_page = {}
+        self.by_tag = {}
+        self.by_priority = {}
+        self.match_all = []
+        self._settings_cache = {}
+        for rule_config in rule_configs:
+            if not isinstance(rule_config, dict):
+                print(f"Warning: Ignoring rule {rule_config!r} (a rule is an object with \"match\" and the settings to apply).")
+                continue
+            unknown = set(rule_config) - {'match', 'topic', 'priority', 'tags', 'lead_times', 'suppress'}
+            if unknown:
+                print(f"Warning: Ignoring unknown rule settings {', '.join(sorted(unknown))}.")
+            match = rule_config.get('match') or {}
+            tag = str(match['tag']).lstrip('#').lower() if match.get('tag') else None
+            priority = str(match['priority']).strip('[#]').upper() if match.get('priority') else None
+            page = page_name(str(match['page'])) if match.get('page') else None
+            settings = {name: str(rule_config[name]) for name in ('topic', 'priority', 'tags') if rule_config.get(name)}
+            if 'lead_times' in rule_config:
+                settings['lead_times'] = parse_lead_times(rule_config['lead_times']) or (0,)
+            if rule_config.get('suppress'):
+                settings['suppress'] = True
+            index = len(self.rules)
+            self.rules.append((tag, priority, page, settings))
+            # Filed under one condition only; settings() checks the others.
+            if page is not None:
+                self.by_page.setdefault(page, []).append(index)
+            elif tag is not None:
+                self.by_tag.setdefault(tag, []).append(index)
+            elif priority is not None:
+                self.by_priority.setdefault(priority, []).append(index)
+            else:
+                self.match_all.append(index)
+        self.max_lead = max((lead for *_, settings in self.rules for lead in settings.get('lead_times', ())), default=0)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def settings(self, event):
+        """Return the merged settings of every rule matching an event (a TaskRecord or Reminder); don't modify it."""
+        description = event.description
+        tags = frozenset(event_tags(description)) if '#' in description else frozenset()
+        priority = task_priority(description)
+        page = page_name(event.page)
+        signature = (page, tags, priority)
+        settings = self._settings_cache.get(signature)
+        if settings is None:
+            candidates = set(self.match_all)
+            candidates.update(self.by_page.get(page, ()))
+            candidates.update(self.by_priority.get(priority, ()))
+            for tag in tags:
+                candidates.update(self.by_tag.get(tag, ()))
+            settings = {}
+            for index in sorted(candidates):
+                rule_tag, rule_priority, rule_page, rule_settings = self.rules[index]
+                if ((rule_tag is None or rule_tag in tags) and (rule_priority is None or rule_priority == priority)
+                        and (rule_page is None or rule_page == page)):
+                    settings.update(rule_settings)
+            self._settings_cache[signature] = settings
+        return settings
+
+def lead_time_resolver(paths_config, rules=None):
+    """Return a function giving an event's lead times.
+
+    A rule that suppresses the event leaves it none. Otherwise a remind:: property on
+    the task wins, then the lead times set by rules, then those of all its tags
+    listed in "tag_lead_times", and finally the profile's "lead_times".
+    """
+    default_leads = parse_lead_times(paths_config.get('lead_times') or [0]) or (0,)
+    tag_leads = {tag.lstrip('#').lower(): parse_lead_times(values)
+                 for tag, values in (paths_config.get('tag_lead_times') or {}).items()}
+
+    def resolve(event):
+        settings = rules.settings(event) if rules else None
+        if settings and settings.get('suppress'):
+            return ()
+        if event.leads:
+            return event.leads
+        if settings and 'lead_times' in settings:
+            return settings['lead_times']
+        if tag_leads and '#' in event.description:
+            matched = set()
+            for tag in event_tags(event.description):
+                matched.update(tag_leads.get(tag, ()))
+            if matched:
+                return tuple(sorted(matched))
+        return default_leads
+    resolve.max_lead = max([*default_leads, *(lead for leads in tag_leads.values() for lead in leads), rules.max_lead if rules else 0])
+    return resolve
+
+class Reminder:
+    """One notification for an occurrence of a TaskRecord, lead seconds before it is due.
+
+    Every lead time is deduplicated on its own ID; a reminder at the due time keeps the
+    event's plain ID so trackers from before lead times existed stay valid.
+    """
+    __slots__ = ('event', 'lead', 'notify_at')
+
+    def __init__(self, event, lead):
+        self.event = event
+        self.lead = lead
+        self.notify_at = event.due - lead
+
+    @property
+    def id(self):
+        return self.event.id if not self.lead else f"{self.event.id}_L{self.lead}"
+
+    @property
+    def due(self):
+        return self.event.due
+
+    @property
+    def datetime(self):
+        return self.event.datetime
+
+    @property
+    def description(self):
+        return self.event.description
+
+    @property
+    def page(self):
+        return self.event.page
+
+    def following(self, now_epoch):
+        """Return this lead time's reminder for the next occurrence of a repeating task not yet past at now_epoch, or None."""
+        if not self.event.repeat:
+            return None
+        return Reminder(upcoming_occurrence(self.event, max(self.event.due + 1, now_epoch + self.lead)), self.lead)
+
+    def __repr__(self):
+        return f"Reminder({self.event!r} lead={self.lead}s)"
+
+def upcoming_reminders(events, resolve_leads, now_epoch, until_epoch=None):
+    """Yield a Reminder for every lead time of every event whose next notification is not yet past.
+
+    With until_epoch, only reminders to be sent up to then are yielded, and a repeating
+    task yields every such occurrence, not just the next one, so a window longer than
+    the repeat interval is covered.
+    """
+    for event in events:
+        for lead in resolve_leads(event):
+            occurrence = upcoming_occurrence(event, now_epoch + lead)
+            if occurrence.due - lead < now_epoch or (until_epoch is not None and occurrence.due - lead > until_epoch):
+                continue
+            yield Reminder(occurrence, lead)
+            if until_epoch is not None and event.repeat:
+                occurrence = upcoming_occurrence(occurrence, occurrence.due + 1)
+                while occurrence.due - lead <= until_epoch:
+                    yield Reminder(occurrence, lead)
+                    occurrence = upcoming_occurrence(occurrence, occurrence.due + 1)
+
+def due_reminders(events, resolve_leads, start_epoch, end_epoch):
+    """Return the reminders to be sent in [start_epoch, end_epoch], earliest first, in one pass over the events.
+
+    A one-shot run asks a single question, so unlike a DueIndex this only builds
+    Reminders for the window, and skips past or far-off one-time tasks without
+    resolving their lead times.
+    """
+    due = []
+    for event in events:
+        if not event.repeat:
+            if event.due < start_epoch:
+                continue
+            max_lead = max(resolve_leads.max_lead, *event.leads) if event.leads else resolve_leads.max_lead
+            if event.due - max_lead > end_epoch:
+                continue
+        for lead in resolve_leads(event):
+            occurrence = upcoming_occurrence(event, start_epoch + lead)
+            if occurrence.due - lead < start_epoch:
+                continue
+            while occurrence.due - lead <= end_epoch:
+                due.append(Reminder(occurrence, lead))
+                if not occurrence.repeat:
+                    break
+                occurrence = upcoming_occurrence(occurrence, occurrence.due + 1)
+    due.sort(key=lambda reminder: reminder.notify_at)
+    return due
+
+class DueIndex:
+    """Reminders sorted by the time they should be sent, answering time-range lookups with bisect.
+
+    Building one costs more than a single linear scan, so only the daemon and the
+    query API, which ask again and again, keep one.
+    """
+    __slots__ = ('times', 'reminders')
+
+    def __init__(self, reminders):
+        self.reminders = sorted(reminders, key=lambda reminder: reminder.notify_at)
+        self.times = [reminder.notify_at for reminder in self.reminders]
+
+    def __len__(self):
+        return len(self.reminders)
+
+    def between(self, start_epoch, end_epoch):
+        """Return the reminders to be sent in [start_epoch, end_epoch], earliest first."""
+        return self.reminders[bisect.bisect_left(self.times, start_epoch):bisect.bisect_right(self.times, end_epoch)]
+
+def parse_markdown_lines(lines, page=None, first_line=1, in_fence=False, key_owners=None):
+    """Extract TaskRecords for every SCHEDULED/DEADLINE timestamp of a task block, in one pass.
+
+    Blocks start at "- " bullets at any indentation and their depth in the block tree
+    follows from the indentation; every following non-bullet line belongs to the same
+    block, so a timestamp only ever attaches to its own block. Lines inside ``` fences
+    are ignored. A task line without a bullet is accepted too, for pages that don't use
+    Logseq's outline format; unindented prose ends such a task.
+
+    first_line and in_fence let a caller parse an excerpt of a larger file; it then
+    passes the same key_owners dict for every excerpt of that file.
+
+    A block's key comes from its id:: property when it has one. Otherwise it is built
+    from the description and its hash, so moving a block doesn't change its key;
+    identical descriptions on one page are numbered. When a page name is given
+    (graph-root mode) it is folded into such keys so pages never collide.
+    """
+    records = []
+    id_prefix = "_"
+    if page:
+        id_prefix += re.sub(r'[^\w-]', '_', page) + "_"
+    epoch_cache = {}
+    # Content key -> line of the block that claimed it first
+    key_owners = {} if key_owners is None else key_owners
+    # Current task block: (marker, description, line_number, depth, content key, lead times, id:: UUID) or None
+    task = None
+
+    for line_number, raw_line in enumerate(lines, first_line):
+        content = raw_line.lstrip(' \t')
+        bullet = content[:2]
+        # A fence opens or closes on any line, whatever block it is in, and nothing inside it
+        # counts. The code belongs to the block around it, unless the fence is its own bullet.
+        if (content[:1] == '`' or content[2:3] == '`') and _is_fence_toggle(content):
+            in_fence = not in_fence
+            if bullet == '- ':
+                task = None
+            continue
+        if in_fence:
+            continue
+        if bullet == '- ' or bullet == '-\n' or bullet == '-\r' or content == '-':
+            # A bullet always starts a new block. Only bullets that open with a marker need
+            # a closer look; everything else just ends the current task block.
+            task_match = _TASK_RE.match(content, 2) if content[2:3] in _TASK_INITIALS else None
+            if task_match is None:
+                task = None
+                continue
+            task = _new_task_context(task_match, line_number, raw_line[:len(raw_line) - len(content)])
+        elif task is None:
+            if content[:1] not in _TASK_INITIALS or len(content) != len(raw_line):
+                continue
+            # Unindented task line outside the outline (pages that don't use bullets).
+            task_match = _TASK_RE.match(content)
+            if task_match is None:
+                continue
+            task = _new_task_context(task_match, line_number, '')
+        elif len(content) == len(raw_line) and not content.startswith(_BLOCK_CONTINUATION_PREFIXES) and '::' not in content:
+            # Unindented prose ends a bare task block; a bare task line replaces it.
+            task_match = _TASK_RE.match(content) if content[:1] in _TASK_INITIALS else None
+            task = _new_task_context(task_match, line_number, '') if task_match else None
+            if task is None:
+                continue
+
+        if content.startswith('remind::'):
+            leads = parse_lead_times(content[8:])
+            task = task[:5] + (leads, task[6])
+            # Properties may come after the block's timestamps.
+            for record in _current_block_records(records, task[2]):
+                record.leads = leads
+            continue
+        if content.startswith('id::'):
+            block_uuid = content[4:].strip()
+            task = task[:6] + (block_uuid,)
+            for record in _current_block_records(records, task[2]):
+                record.key = _block_key_prefix(record.kind) + "_" + block_uuid
+            continue
+        if 'SCHEDULED:' not in content and 'DEADLINE:' not in content:
+            continue
+        marker, description, task_line, depth, content_key, leads, block_uuid = task
+        for schedule_match in _TIMESTAMP_RE.finditer(content):
+            kind, year, month, day, hour, minute, repeat_count, repeat_unit = schedule_match.groups()
+            epoch_key = (year, month, day, hour, minute)
+            due = epoch_cache.get(epoch_key)
+            if due is None:
+                try:
+                    due = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0)).timestamp()
+                except ValueError as e:
+                    print(f"Warning: Could not parse date/time for task '{description}' ({page or 'markdown'} line ~{line_number}): {e}. Line: '{content.strip()}'")
+                    continue
+                epoch_cache[epoch_key] = due
+            repeat = (int(repeat_count), repeat_unit) if repeat_unit else None
+            if block_uuid:
+                key = _block_key_prefix(kind) + "_" + block_uuid
+            else:
+                key = _block_key_prefix(kind) + id_prefix + content_key
+                if key_owners.setdefault(key, task_line) != task_line:
+                    duplicate = 2
+                    while key_owners.setdefault(f"{key}_{duplicate}", task_line) != task_line:
+                        duplicate += 1
+                    key = f"{key}_{duplicate}"
+            records.append(TaskRecord(page, task_line, depth, marker, kind, due, repeat, description, key, leads))
+    return records
+
+def _is_fence_toggle(content):
+    """Return whether a line, without its indentation, opens or closes a ``` fence."""
+    return (content.startswith('```') or content.startswith('- ```')) and content.count('```') % 2 == 1
+
+def _block_key_prefix(kind):
+    return "logseq_md_event" if kind == 'SCHEDULED' else "logseq_md_deadline"
+
+def _current_block_records(records, task_line):
+    """Yield the records already emitted for the block that starts at task_line."""
+    for record in reversed(records):
+        if record.line != task_line:
+            return
+        yield record
+
+def _new_task_context(task_match, line_number, indent):
+    import hashlib
+    description = task_match.group(2).strip()
+    sanitized = _ID_UNSAFE_RE.sub('', description).strip().replace(' ', '_')[:30]
+    content_key = f"{sanitized}_{hashlib.blake2s(description.encode('utf-8'), digest_size=4).hexdigest()}"
+    # Logseq indents one level per tab, or per two spaces when configured to use spaces.
+    depth = indent.count('\t') + indent.count(' ') // 2
+    return task_match.group(1), description, line_number, depth, content_key, None, None
+
+def find_graph_markdown_files(graph_root):
+    """Return (path, page) pairs for every .md file under the graph's pages/ and journals/ directories."""
+    found = []
+    for sub_dir in GRAPH_SCAN_DIRS:
+        pending_dirs = [os.path.join(graph_root, sub_dir)]
+        while pending_dirs:
+            current_dir = pending_dirs.pop()
+            try:
+                with os.scandir(current_dir) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            pending_dirs.append(entry.path)
+                        elif entry.name.endswith('.md') and entry.is_file():
+                            page = os.path.relpath(entry.path, graph_root)[:-3].replace(os.sep, '/')
+                            found.append((entry.path, page))
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                print(f"Warning: Could not list graph directory {current_dir}: {e}")
+    found.sort()
+    return found
+
+def _count_newlines(data, start, end):
+    """Count newlines in data[start:end] without copying more than one chunk of an mmap at a time."""
+    if isinstance(data, bytes):
+        return data.count(b'\n', start, end)
+    count = 0
+    while start < end:
+        chunk_end = min(start + MMAP_SCAN_CHUNK_BYTES, end)
+        count += data[start:chunk_end].count(b'\n')
+        start = chunk_end
+    return count
+
+def _fence_toggle_offsets(data):
+    """Return the offsets of lines that open or close a ``` fence, by the rule parse_markdown_lines uses."""
+    offsets = []
+    position = data.find(b'```')
+    while position != -1:
+        line_start = data.rfind(b'\n', 0, position) + 1
+        line_end = data.find(b'\n', position)
+        if line_end == -1:
+            line_end = len(data)
+        if _is_fence_toggle(data[line_start:line_end].lstrip(b' \t').decode('utf-8', 'replace')):
+            offsets.append(line_start)
+        position = data.find(b'```', line_end)
+    return offsets
+
+def _ends_block(line):
+    """Return whether a line (bytes, outside any fence) ends the block before it, as parse_markdown_lines sees it."""
+    content = line.lstrip(b' \t')
+    if content[:2] == b'- ' or content[:2] == b'-\r' or content.rstrip(b'\n') == b'-':
+        return True
+    return len(content) == len(line) and not content.startswith(_BLOCK_CONTINUATION_PREFIXES_BYTES) and b'::' not in content
+
+def _block_start(data, line_start, fence_offsets):
+    """Walk back from a line to the first line of its block (a bullet, or unindented text), skipping fenced code."""
+    lookback_limit = line_start - MAX_BLOCK_LOOKBACK_BYTES
+    position = line_start
+    while position > 0 and position > lookback_limit:
+        fence_index = bisect.bisect_left(fence_offsets, position)
+        if fence_index % 2 == 1:
+            # Inside a fence, or on its closing line: continue from the line that opened it.
+            position = fence_offsets[fence_index - 1]
+            continue
+        line_end = data.find(b'\n', position)
+        line = data[position:line_end if line_end != -1 else len(data)]
+        if fence_index < len(fence_offsets) and fence_offsets[fence_index] == position:
+            # An opening fence belongs to the block around it, unless it is a bullet of its own.
+            if line.lstrip(b' \t')[:2] == b'- ':
+                return position
+        elif _ends_block(line):
+            return position
+        position = data.rfind(b'\n', 0, position - 1) + 1
+    return position
+
+def _block_end(data, line_end, fence_offsets):
+    """Return the offset just past the lines that follow a timestamp line in the same block, fenced code included."""
+    limit = min(len(data), line_end + MAX_BLOCK_LOOKBACK_BYTES)
+    while line_end < limit:
+        next_line = data.find(b'\n', line_end)
+        next_line = len(data) if next_line == -1 else next_line + 1
+        line = data[line_end:next_line]
+        fence_index = bisect.bisect_left(fence_offsets, line_end)
+        if fence_index < len(fence_offsets) and fence_offsets[fence_index] == line_end:
+            if line.lstrip(b' \t')[:2] == b'- ':
+                return line_end
+            # Jump past the closing fence line, or to the end of the file if the fence never closes.
+            if fence_index + 1 >= len(fence_offsets):
+                return len(data)
+            closing_line = fence_offsets[fence_index + 1]
+            next_line = data.find(b'\n', closing_line)
+            next_line = len(data) if next_line == -1 else next_line + 1
+        elif _ends_block(line):
+            return line_end
+        line_end = next_line
+    return line_end
+
+def _scheduled_block_regions(data, fence_offsets):
+    """Return merged (start, end) byte ranges covering every block that contains a SCHEDULED/DEADLINE anchor."""
+    regions = []
+    for anchor in (b'SCHEDULED:', b'DEADLINE:'):
+        position = data.find(anchor)
+        while position != -1:
+            line_start = data.rfind(b'\n', 0, position) + 1
+            line_end = data.find(b'\n', position)
+            line_end = len(data) if line_end == -1 else line_end + 1
+            regions.append((_block_start(data, line_start, fence_offsets), _block_end(data, line_end, fence_offsets)))
+            position = data.find(anchor, line_end)
+    regions.sort()
+    merged = []
+    for start, end in regions:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def parse_markdown_bytes(data, page=None):
+    """Parse only the blocks around SCHEDULED/DEADLINE anchors of a markdown file held as bytes or an mmap.
+
+    Files without any anchor are rejected after a byte search, without decoding a
+    single line; otherwise just the surrounding blocks are decoded and parsed. Blocks
+    are found with the same bullet and fence rules as parse_markdown_lines, so both
+    give the same records for the same file.
+    """
+    if data.find(b'SCHEDULED:') == -1 and data.find(b'DEADLINE:') == -1:
+        return []
+    fence_offsets = _fence_toggle_offsets(data)
+    regions = _scheduled_block_regions(data, fence_offsets)
+    records = []
+    key_owners = {}
+    line_number = 1
+    counted_to = 0
+    for start, end in regions:
+        line_number += _count_newlines(data, counted_to, start)
+        counted_to = start
+        in_fence = bisect.bisect_left(fence_offsets, start) % 2 == 1
+        lines = data[start:end].decode('utf-8').splitlines(keepends=True)
+        records.extend(parse_markdown_lines(lines, page, line_number, in_fence, key_owners))
+    return records
+
+def _parse_markdown_source(job):
+    """Parse one markdown file; runs inside a worker process, so errors are returned rather than raised.
+
+    The job is (path, page, cached_sha1). When the content hash still matches the
+    cached one the file was only touched, so parsing is skipped and events is None.
+    Large files are memory-mapped so peak memory stays flat regardless of file size.
+    Returns (path, sha1, events, error, stats); stats is (bytes, lines, read seconds,
+    parse seconds, peak allocated bytes), or None on error. The peak is only measured
+    while tracemalloc is tracing (--profile), and is 0 otherwise.
+    """
+    import hashlib
+    import tracemalloc
+    path, page, cached_sha1 = job
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        allocated_before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
     try:
-        encoded_title = title.encode('utf-8').decode('latin-1')
-    except UnicodeEncodeError:
-        encoded_title = title 
-    command.extend(['-H', f'Title: {encoded_title}'])
-    command.extend(['-H', f'Priority: {priority}'])
-    if tags: command.extend(['-H', f'Tags: {tags}'])
-    command.extend(['-d', body.encode('utf-8')])
-    command.append(full_topic_url)
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            data = None
+            if size >= MMAP_MIN_FILE_BYTES:
+                try:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    data = None
+            if data is None:
+                data = f.read()
+            try:
+                content_sha1 = hashlib.sha1(data).hexdigest()
+                line_count = _count_newlines(data, 0, size)
+                read_seconds = time.perf_counter() - start
+                records = None
+                if content_sha1 != cached_sha1:
+                    records = parse_markdown_bytes(data, page)
+                parse_seconds = time.perf_counter() - start - read_seconds
+                peak_bytes = tracemalloc.get_traced_memory()[1] - allocated_before if tracing else 0
+                return path, content_sha1, records, None, (size, line_count, read_seconds, parse_seconds, peak_bytes)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+    except (IOError, UnicodeDecodeError) as e:
+        return path, None, [], f"Error reading markdown file {path}: {e}", None
+
+def load_parse_cache(cache_file):
+    """Load the per-file parse cache, discarding it if it was written by another cache version."""
     try:
-        result = subprocess.run(command, check=False, capture_output=True, text=False)
-        stdout_decoded = result.stdout.decode('utf-8', errors='replace')
-        stderr_decoded = result.stderr.decode('utf-8', errors='replace')
-        if result.returncode == 0: print(f"Notification sent successfully. Response: {stdout_decoded}")
-        else: print(f"Failed to send notification. Code: {result.returncode}\nStderr: {stderr_decoded}\nStdout: {stdout_decoded}")
-    except FileNotFoundError: print("Error: curl not found. Please install curl and ensure it's in your PATH (e.g., on Linux: sudo apt install curl; on Termux: pkg install curl).")
-    except Exception as e: print(f"Error sending ntfy notification: {e}")
-
-def should_send_notification(tracker_file, task_unique_id):
-    """Determine if the notification should be sent based on the tracker file."""
-    if not tracker_file:
-        print("Error: Notification tracker file path not configured.")
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('version') == PARSE_CACHE_VERSION and isinstance(cache.get('files'), dict):
+            return cache
+    except FileNotFoundError:
+        pass
+    except (IOError, ValueError) as e:
+        print(f"Ignoring unreadable parse cache {cache_file}: {e}")
+    return {'version': PARSE_CACHE_VERSION, 'files': {}}
+
+def save_parse_cache(cache_file, cache):
+    """Write the parse cache via a temp file so an interrupted run never leaves half a file behind."""
+    try:
+        _replace_file(cache_file, json.dumps(cache, separators=(',', ':')))
+    except IOError as e:
+        print(f"Error saving parse cache {cache_file}: {e}")
+
+def _events_to_cache(events):
+    return [event.to_list() for event in events]
+
+def _events_from_cache(cached_events):
+    return [TaskRecord(*fields) for fields in cached_events]
+
+def _live_until(records):
+    """Return the last due time among the records, or None if one repeats and so never runs out of reminders."""
+    live_until = 0
+    for record in records:
+        if record.repeat:
+            return None
+        live_until = max(live_until, record.due)
+    return live_until
+
+def _retired(entry, not_before):
+    """Tell whether a cached file can no longer produce a reminder at or after not_before."""
+    if not_before is None:
         return False
-    tracker_dir = os.path.dirname(tracker_file)
-    if not os.path.exists(tracker_dir) and tracker_dir != "":
-        try: os.makedirs(tracker_dir, exist_ok=True)
+    if 'live_until' not in entry:
+        entry['live_until'] = _live_until(_events_from_cache(entry['events']))
+    return entry['live_until'] is not None and entry['live_until'] < not_before
+
+def journal_page_epoch(page):
+    """Return the date of a journals/YYYY_MM_DD page as an epoch, or None for any other page."""
+    match = _JOURNAL_PAGE_RE.match(page or '')
+    if not match:
+        return None
+    try:
+        return datetime(int(match.group(1)), int(match.group(2)), int(match.group(3))).timestamp()
+    except ValueError:
+        return None
+
+def _blocks_by_key(records, excluded_keys):
+    """Return {key: (kind, due times, description, line)} for the blocks whose key is not excluded."""
+    blocks = {}
+    for record in records:
+        if record.key not in excluded_keys:
+            block = blocks.setdefault(record.key, (record.kind, set(), record.description, record.line))
+            block[1].add(record.due)
+    return blocks
+
+def carry_over_block_keys(old_records, new_records):
+    """Give the edited blocks of a re-parsed file the keys they had before the edit.
+
+    The parse cache doubles as the persisted identity map: a block whose key is new
+    is matched to a block of the same kind whose key disappeared, preferring one with
+    the same due times and a loosely similar description (nearest line first), else
+    the most similar description. A typo fix, a rewording or a newly added id::
+    property then keeps the old key, so it is neither notified twice nor leaves a
+    dead tracker entry, while a new task that merely replaced a deleted one at the
+    same time gets a key of its own. Returns how many blocks kept their key.
+    """
+    vanished = _blocks_by_key(old_records, {record.key for record in new_records})
+    if not vanished:
+        return 0
+    import difflib
+    fresh = _blocks_by_key(new_records, {record.key for record in old_records})
+    by_schedule = {}
+    for old_key, (kind, dues, _, line) in vanished.items():
+        by_schedule.setdefault((kind, frozenset(dues)), []).append((line, old_key))
+    renames = {}
+    used_keys = set()
+    unmatched = []
+    for key, (kind, dues, description, line) in fresh.items():
+        candidates = sorted((abs(old_line - line), old_key) for old_line, old_key in by_schedule.get((kind, frozenset(dues)), ())
+                            if old_key not in used_keys)
+        for _, old_key in candidates:
+            if difflib.SequenceMatcher(None, description, vanished[old_key][2]).ratio() >= BLOCK_MATCH_SCHEDULE_MIN_SIMILARITY:
+                renames[key] = old_key
+                used_keys.add(old_key)
+                break
+        else:
+            unmatched.append(key)
+    leftover = [old_key for old_key in vanished if old_key not in used_keys]
+    # Comparing descriptions is quadratic; a page that was rewritten wholesale just gets new keys.
+    if unmatched and leftover and len(unmatched) * len(leftover) <= BLOCK_MATCH_MAX_COMPARISONS:
+        for key in unmatched:
+            kind, _, description, _ = fresh[key]
+            best_ratio, best_key = BLOCK_MATCH_MIN_SIMILARITY, None
+            for old_key in leftover:
+                old_kind, _, old_description, _ = vanished[old_key]
+                if old_kind != kind or old_key in used_keys:
+                    continue
+                ratio = difflib.SequenceMatcher(None, description, old_description).ratio()
+                if ratio >= best_ratio:
+                    best_ratio, best_key = ratio, old_key
+            if best_key is not None:
+                renames[key] = best_key
+                used_keys.add(best_key)
+    for record in new_records:
+        if record.key in renames:
+            record.key = renames[record.key]
+    if renames:
+        log(f"Kept the keys of {len(renames)} edited blocks.")
+    return len(renames)
+
+def scan_markdown_files(markdown_files, cache_file=None, workers=None, not_before=None, changed_names=None):
+    """Return (events, failed_paths) for (path, page) pairs, re-parsing only files that changed.
+
+    A file whose (mtime_ns, size) signature matches the parse cache is not opened at
+    all. Changed files are re-read, but only re-parsed if their content hash differs.
+    Stale files are fanned out over a process pool when there are enough of them.
+
+    With not_before set, files without a repeater whose last due time lies before it
+    are retired: the cache keeps only their signature, and settled journal pages
+    among them are skipped without a stat until the next daily full check. Files whose
+    name is in changed_names (the daemon knows which files were written) are always
+    checked.
+
+    A profiled run (--profile) reads and parses every file, so each one is measured.
+    """
+    metrics = run_metrics()
+    profiling = metrics.file_costs is not None
+    stat_start = time.perf_counter()
+    cache = load_parse_cache(cache_file) if cache_file else {'version': PARSE_CACHE_VERSION, 'files': {}}
+    cached_files = cache['files']
+    fresh_files = {}
+    cache_dirty = len(cached_files) != len(markdown_files)
+    events = []
+    failed_paths = []
+    jobs = []
+    signatures = {}
+    now_epoch = time.time()
+    check_all_journals = not_before is None or now_epoch - cache.get('journals_checked', 0) >= JOURNAL_RECHECK_SECONDS
+    settled_before = now_epoch - JOURNAL_SETTLED_DAYS * 86400
+    journals_skipped = 0
+
+    for path, page in markdown_files:
+        entry = cached_files.get(path)
+        if (entry and not profiling and not check_all_journals and _retired(entry, not_before)
+                and not (changed_names and os.path.basename(path) in changed_names)):
+            journal_epoch = journal_page_epoch(page)
+            if journal_epoch is not None and journal_epoch < settled_before:
+                fresh_files[path] = entry
+                journals_skipped += 1
+                continue
+        try:
+            st = os.stat(path)
         except OSError as e:
-            print(f"Error creating directory for tracker file {tracker_dir}: {e}")
-            return False
-    sent_notifications = set()
-    if os.path.exists(tracker_file):
+            print(f"Error reading markdown file {path}: {e}")
+            failed_paths.append(path)
+            continue
+        signature = [st.st_mtime_ns, st.st_size]
+        if entry and entry['sig'] == signature and not profiling:
+            fresh_files[path] = entry
+            if not _retired(entry, not_before):
+                events.extend(_events_from_cache(entry['events']))
+            elif entry['events']:
+                entry['events'] = []
+                cache_dirty = True
+        else:
+            signatures[path] = signature
+            jobs.append((path, page, entry['sha1'] if entry and not profiling else None))
+    if check_all_journals and not_before is not None:
+        cache['journals_checked'] = now_epoch
+        cache_dirty = True
+
+    log(f"Parse cache: {len(fresh_files) - journals_skipped} unchanged files and {journals_skipped} settled journal pages skipped, {len(jobs)} to read.")
+    metrics.add_time('read', time.perf_counter() - stat_start)
+    metrics.count('files', len(markdown_files))
+    metrics.count('files_cached', len(fresh_files))
+    metrics.count('journals_skipped', journals_skipped)
+    workers = workers or os.cpu_count() or 1
+    if profiling:
+        # cProfile and tracemalloc only see this process, so a profiled run parses serially.
+        workers = 1
+    results = None
+    if workers > 1 and len(jobs) >= PARALLEL_SCAN_MIN_FILES:
         try:
-            with open(tracker_file, 'r', encoding='utf-8') as f: sent_notifications = set(line.strip() for line in f)
-        except IOError as e: print(f"Error reading tracker file {tracker_file}: {e}")
-    if task_unique_id in sent_notifications:
-        print(f"Notification previously sent for event ID: {task_unique_id}.")
-        return False
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Forking is the quickest start, but only safe while this is the process's only thread. Profiles
+            # read concurrently and the daemon's sender threads could hold a lock the child would inherit
+            # locked, so then the workers start from a fork server (or spawn) instead.
+            start_method = None
+            if threading.active_count() > 1:
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            # Many small tasks per worker keeps every core busy without paying IPC per file.
+            chunk_size = max(1, len(jobs) // (workers * 8))
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method)) as pool:
+                results = list(pool.map(_parse_markdown_source, jobs, chunksize=chunk_size))
+            log(f"Parsed {len(jobs)} files with {workers} worker processes.")
+        except (ImportError, NotImplementedError, OSError, RuntimeError) as e:
+            # Termux and some sandboxes lack sem_open, and a worker that can't start breaks the pool
+            # (BrokenProcessPool is a RuntimeError); a serial scan still works there.
+            log(f"Process pool unavailable ({e}); scanning files serially.")
+            results = None
+    if results is None:
+        results = [_parse_markdown_source(job) for job in jobs]
+
+    for path, content_sha1, file_events, error, stats in results:
+        if error:
+            print(error)
+            failed_paths.append(path)
+            metrics.count('files_failed')
+            continue
+        file_bytes, line_count, read_seconds, parse_seconds, peak_bytes = stats
+        if profiling:
+            metrics.file_costs.append((path, read_seconds + parse_seconds, peak_bytes, line_count))
+        metrics.count('files_read')
+        metrics.count('bytes_read', file_bytes)
+        metrics.count('lines_read', line_count)
+        metrics.add_time('read', read_seconds)
+        metrics.add_time('parse', parse_seconds)
+        cache_dirty = True
+        if file_events is None:
+            entry = cached_files[path]
+            entry['sig'] = signatures[path]
+            if not _retired(entry, not_before):
+                events.extend(_events_from_cache(entry['events']))
+        else:
+            if path in cached_files:
+                carry_over_block_keys(_events_from_cache(cached_files[path]['events']), file_events)
+            entry = {'sig': signatures[path], 'sha1': content_sha1, 'live_until': _live_until(file_events)}
+            if _retired(entry, not_before):
+                entry['events'] = []
+            else:
+                entry['events'] = _events_to_cache(file_events)
+                events.extend(file_events)
+        fresh_files[path] = entry
+
+    if cache_file and cache_dirty:
+        cache['files'] = fresh_files
+        with metrics.phase('read'):
+            save_parse_cache(cache_file, cache)
+    metrics.count('events', len(events))
+    return events, failed_paths
+
+def scan_graph(graph_root, cache_file=None, workers=None, not_before=None, changed_names=None):
+    """Parse every markdown file of a graph, re-parsing only files changed since the last run."""
+    graph_files = find_graph_markdown_files(graph_root)
+    log(f"Found {len(graph_files)} markdown files under graph root {graph_root}.")
+    events, _ = scan_markdown_files(graph_files, cache_file, workers, not_before, changed_names)
+    return events
+
+def _ntfy_connection(server_url):
+    """Return this thread's persistent connection to an ntfy server, opening it on first use."""
+    import http.client
+    from urllib.parse import urlsplit
+    connections = getattr(_ntfy_thread_state, 'connections', None)
+    if connections is None:
+        connections = _ntfy_thread_state.connections = {}
+    connection = connections.get(server_url)
+    if connection is None:
+        parsed = urlsplit(server_url)
+        connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(parsed.hostname, parsed.port, timeout=NTFY_TIMEOUT_SECONDS)
+        connections[server_url] = connection
+        with _ntfy_connections_lock:
+            _ntfy_all_connections.append(connection)
+    return connection
+
+def _drop_ntfy_connection(server_url):
+    """Close and forget this thread's connection after an error so the next attempt reconnects."""
+    connection = getattr(_ntfy_thread_state, 'connections', {}).pop(server_url, None)
+    if connection is not None:
+        connection.close()
+
+def close_ntfy_connections():
+    """Close every connection opened by any sender thread."""
+    with _ntfy_connections_lock:
+        for connection in _ntfy_all_connections:
+            connection.close()
+        _ntfy_all_connections.clear()
+
+def _encode_header_value(value):
+    """Header values must be latin-1; anything else is sent RFC 2047 encoded, which ntfy decodes."""
+    import base64
+    try:
+        value.encode('latin-1')
+        return value
+    except UnicodeEncodeError:
+        return "=?UTF-8?B?" + base64.b64encode(value.encode('utf-8')).decode('ascii') + "?="
+
+class TokenBucket:
+    """Thread-safe token bucket handing out send slots, so a burst beyond its size is spread out at the refill rate."""
+    __slots__ = ('burst', 'per_second', 'tokens', 'updated', '_lock')
+
+    def __init__(self, burst, per_second):
+        self.burst = max(burst, 1)
+        self.per_second = per_second
+        self.tokens = float(self.burst)
+        # May lie in the future while paused; nothing refills before then.
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.per_second)
+            self.updated = now
+
+    def reserve(self, max_wait=None):
+        """Take a slot and return how many seconds to wait before using it.
+
+        A slot that is not refilled yet may be taken, queueing the caller behind earlier
+        ones. Returns None, taking nothing, if the wait would be longer than max_wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self.updated - now, 0.0) + max(1 - self.tokens, 0.0) / self.per_second
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+    def wait_time(self):
+        """Return how many seconds until the next slot is free, without taking it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return max(self.updated - now, 0.0) + max(1 - self.tokens, 0.0) / self.per_second
+
+    def pause(self, seconds):
+        """Hand out no slots for this long (a 429's Retry-After); afterwards one goes right away and the rest refill."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now + seconds > self.updated:
+                self.updated = now + seconds
+                self.tokens = min(self.tokens, 1.0)
+
+def configure_rate_limit(rate_limit_config):
+    """Apply the top-level "rate_limit" setting ({"burst", "per_second"}); false or a per_second of 0 turns it off."""
+    global _rate_limit
+    if rate_limit_config is False:
+        rate_limit_config = {'per_second': 0}
+    rate_limit_config = rate_limit_config or {}
+    with _rate_limiters_lock:
+        _rate_limit = (int(rate_limit_config.get('burst', NTFY_RATE_LIMIT_BURST)),
+                       float(rate_limit_config.get('per_second', NTFY_RATE_LIMIT_PER_SECOND)))
+        _rate_limiters.clear()
+
+def rate_limiter(server_url, topic):
+    """Return the token bucket of a topic on a server, or None when rate limiting is off."""
+    burst, per_second = _rate_limit
+    if per_second <= 0:
+        return None
+    with _rate_limiters_lock:
+        bucket = _rate_limiters.get((server_url, topic))
+        if bucket is None:
+            bucket = _rate_limiters[(server_url, topic)] = TokenBucket(burst, per_second)
+    return bucket
+
+def pause_rate_limiters(server_url, seconds):
+    """Pause every topic on a server; ntfy counts requests per client, not per topic."""
+    with _rate_limiters_lock:
+        buckets = [bucket for (server, _), bucket in _rate_limiters.items() if server == server_url]
+    for bucket in buckets:
+        bucket.pause(seconds)
+
+def _retry_after_seconds(value):
+    """Return the delay of a Retry-After header (seconds or an HTTP date), or None if it is missing or malformed."""
+    if not value:
+        return None
     try:
-        with open(tracker_file, 'a', encoding='utf-8') as f: f.write(task_unique_id + '\n')
-        print(f"Notification for event ID {task_unique_id} marked as sent.")
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def send_ntfy_notification(topic, title, body, priority="default", tags=None, server=None, max_attempts=NTFY_MAX_ATTEMPTS,
+                           max_wait=NTFY_RATE_LIMIT_MAX_WAIT_SECONDS):
+    """Send a notification to an ntfy server over a kept-alive HTTP connection.
+
+    Each attempt waits for a slot from the topic's rate limiter. Connection errors and
+    5xx responses are retried with exponential backoff; a 429 pauses the server's
+    limiters for its Retry-After. Gives up early rather than wait longer than max_wait.
+    Returns a status dict: ok, status (HTTP code or None), attempts, error, seconds taken,
+    and retry_after, the seconds after which to try again when rate limited (else None).
+    """
+    import http.client
+    from urllib.parse import quote, urlsplit
+    if not topic:
+        print("Error: ntfy.sh topic is not configured. Cannot send notification.")
+        return {'ok': False, 'status': None, 'attempts': 0, 'error': "no topic configured", 'seconds': 0.0, 'retry_after': None}
+    server_url = (server or NTFY_DEFAULT_SERVER).rstrip('/')
+    topic_path = urlsplit(server_url).path + '/' + quote(topic)
+    log(f"Sending ntfy notification to topic '{topic}' with title: '{title}' and body: '{body}'.")
+    headers = {
+        'Title': _encode_header_value(title),
+        'Priority': priority,
+        'Content-Type': 'text/plain; charset=utf-8',
+    }
+    if tags: headers['Tags'] = tags
+    payload = body.encode('utf-8')
+
+    limiter = rate_limiter(server_url, topic)
+    status, error, retry_after = None, None, None
+    start = time.perf_counter()
+    for attempt in range(1, max_attempts + 1):
+        if limiter is not None:
+            wait = limiter.reserve(max_wait)
+            if wait is None:
+                log(f"Rate limit for topic '{topic}' reached; leaving the notification for later.")
+                return {'ok': False, 'status': status, 'attempts': attempt - 1, 'error': error or "rate limited",
+                        'seconds': time.perf_counter() - start, 'retry_after': limiter.wait_time()}
+            if wait > 0:
+                time.sleep(wait)
+        retry_after = None
+        try:
+            connection = _ntfy_connection(server_url)
+            connection.request('POST', topic_path, body=payload, headers=headers)
+            response = connection.getresponse()
+            status = response.status
+            response_text = response.read().decode('utf-8', errors='replace')
+            if 200 <= status < 300:
+                log(f"Notification sent successfully. Response: {response_text.strip()}")
+                return {'ok': True, 'status': status, 'attempts': attempt, 'error': None,
+                        'seconds': time.perf_counter() - start, 'retry_after': None}
+            error = f"HTTP {status}: {response_text.strip()}"
+            if response.will_close:
+                _drop_ntfy_connection(server_url)
+            if status == 429:
+                retry_after = _retry_after_seconds(response.getheader('Retry-After'))
+                if retry_after is None:
+                    retry_after = NTFY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                pause_rate_limiters(server_url, retry_after)
+                if retry_after > max_wait:
+                    break
+            elif status < 500:
+                break
+        except (OSError, http.client.HTTPException) as e:
+            # A kept-alive connection the server already closed lands here too; reconnect and retry.
+            error = f"{type(e).__name__}: {e}"
+            _drop_ntfy_connection(server_url)
+        if attempt < max_attempts:
+            # After a 429 the paused rate limiter does the waiting.
+            if retry_after is None:
+                time.sleep(NTFY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            elif limiter is None:
+                time.sleep(retry_after)
+    print(f"Failed to send notification to topic '{topic}' after {attempt} attempt(s): {error}")
+    return {'ok': False, 'status': status, 'attempts': attempt, 'error': error, 'seconds': time.perf_counter() - start,
+            'retry_after': retry_after}
+
+def _send_ntfy_message(message, max_attempts=NTFY_MAX_ATTEMPTS, deadline=None):
+    max_wait = NTFY_RATE_LIMIT_MAX_WAIT_SECONDS if deadline is None else max(deadline - time.monotonic(), 0.0)
+    return send_ntfy_notification(message['topic'], message['title'], message['body'],
+                                  priority=message.get('priority', 'default'), tags=message.get('tags'),
+                                  server=message.get('server'), max_attempts=max_attempts, max_wait=max_wait)
+
+def _interleave_by_topic(messages):
+    """Return message indices taking turns between (server, topic) pairs, so one topic's backlog can't hold up the others."""
+    queues = {}
+    for index, message in enumerate(messages):
+        queues.setdefault((message.get('server'), message['topic']), []).append(index)
+    return [index for turn in itertools.zip_longest(*queues.values()) for index in turn if index is not None]
+
+def send_ntfy_batch(messages, workers=NTFY_SEND_WORKERS, max_attempts=NTFY_MAX_ATTEMPTS):
+    """Send messages concurrently through a bounded thread pool; returns one status dict per message, in order.
+
+    Messages still waiting for the rate limit when the batch has run for the maximum
+    wait are not sent; their result has attempts 0 and a retry_after.
+    """
+    global _ntfy_send_pool
+    if not messages:
+        return []
+    order = _interleave_by_topic(messages)
+    scheduled = [messages[index] for index in order]
+    deadline = time.monotonic() + NTFY_RATE_LIMIT_MAX_WAIT_SECONDS
+    if workers <= 1 or len(messages) == 1:
+        scheduled_results = [_send_ntfy_message(message, max_attempts, deadline) for message in scheduled]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        # The pool outlives a single batch so daemon mode keeps its worker threads' connections warm.
+        if _ntfy_send_pool is None or _ntfy_send_pool._max_workers != workers:
+            _ntfy_send_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ntfy-send')
+        scheduled_results = list(_ntfy_send_pool.map(_send_ntfy_message, scheduled, [max_attempts] * len(scheduled),
+                                                      [deadline] * len(scheduled)))
+    results = [None] * len(messages)
+    for index, result in zip(order, scheduled_results):
+        results[index] = result
+    sent_count = sum(1 for result in results if result['ok'])
+    log(f"Sent {sent_count}/{len(messages)} notifications.")
+    return results
+
+class NotificationTracker:
+    """Set of already-notified event IDs plus the outbox of notifications still to deliver, backed by SQLite.
+
+    The IDs are loaded into memory once, so membership checks are O(1); the IDs of
+    a delivery pass are written in one transaction by delivered(). Entries older
+    than the retention period are expired when the tracker is opened.
+
+    Queued messages live in the outbox table until the server accepts them; only then
+    are their IDs moved to the sent table, in the same transaction. A flag file next
+    to the database exists while the outbox is not empty, so runs with nothing due
+    can tell whether there is anything to retry without opening the database.
+
+    Overlapping runs share the database: file_lock serialises their check-then-write
+    steps, and refresh() picks up what the others sent or queued in the meantime.
+    """
+
+    def __init__(self, tracker_file, retention_days=TRACKER_RETENTION_DAYS):
+        import sqlite3
+        self.db_path = tracker_db_path(tracker_file)
+        tracker_dir = os.path.dirname(self.db_path)
+        if tracker_dir:
+            os.makedirs(tracker_dir, exist_ok=True)
+        # The daemon's outbox worker thread shares this connection; _lock serialises access.
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # Lock order: file_lock before _lock.
+        self.file_lock = FileLock(f"{self.db_path}.lock")
+        self.outbox_flag_file = outbox_flag_path(tracker_file)
+        with self.file_lock:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sent (id TEXT PRIMARY KEY, sent_at INTEGER NOT NULL) WITHOUT ROWID")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS sent_at_idx ON sent (sent_at)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY, message TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                              "next_attempt REAL NOT NULL, queued_at REAL NOT NULL, last_error TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_next_attempt_idx ON outbox (next_attempt)")
+            self._migrate_text_tracker(tracker_file)
+            if retention_days:
+                expired = self.conn.execute("DELETE FROM sent WHERE sent_at < ?", (int(time.time() - retention_days * 86400),)).rowcount
+                if expired:
+                    log(f"Expired {expired} tracker entries older than {retention_days} days.")
+            self.conn.commit()
+        # sent_at has whole seconds; one second of overlap makes sure refresh() misses nothing.
+        self.refreshed_at = int(time.time()) - 1
+        self.sent_ids = set(row[0] for row in self.conn.execute("SELECT id FROM sent"))
+        self.queued_ids = set()
+        for (message_json,) in self.conn.execute("SELECT message FROM outbox"):
+            self.queued_ids.update(json.loads(message_json)['ids'])
+
+    def _migrate_text_tracker(self, tracker_file):
+        """Import IDs from the old append-only text tracker once, then move it out of the way."""
+        import sqlite3
+        if not tracker_file.endswith('.txt') or not os.path.exists(tracker_file):
+            return
+        try:
+            migrated_at = int(os.path.getmtime(tracker_file))
+            with open(tracker_file, 'r', encoding='utf-8') as f:
+                legacy_ids = set(line.strip() for line in f if line.strip())
+            self.conn.executemany("INSERT OR IGNORE INTO sent (id, sent_at) VALUES (?, ?)", ((task_id, migrated_at) for task_id in legacy_ids))
+            self.conn.commit()
+            os.replace(tracker_file, tracker_file + '.migrated')
+            log(f"Migrated {len(legacy_ids)} entries from text tracker {tracker_file} to {self.db_path}.")
+        except (IOError, sqlite3.Error) as e:
+            print(f"Error migrating text tracker {tracker_file}: {e}")
+
+    def __contains__(self, task_unique_id):
+        return task_unique_id in self.sent_ids
+
+    def refresh(self):
+        """Pick up the IDs other processes sent or queued since this tracker was opened or last refreshed."""
+        with self._lock:
+            sent_rows = self.conn.execute("SELECT id FROM sent WHERE sent_at >= ?", (self.refreshed_at,)).fetchall()
+            outbox_rows = self.conn.execute("SELECT message FROM outbox").fetchall()
+        self.refreshed_at = int(time.time()) - 1
+        self.sent_ids.update(row[0] for row in sent_rows)
+        queued_ids = set()
+        for (message_json,) in outbox_rows:
+            queued_ids.update(json.loads(message_json)['ids'])
+        self.queued_ids = queued_ids
+
+    def is_queued(self, task_unique_id):
+        return task_unique_id in self.queued_ids
+
+    def __len__(self):
+        return len(self.sent_ids)
+
+    def enqueue(self, messages):
+        """Store messages in the outbox in one transaction; returns False if they could not be stored."""
+        import sqlite3
+        if not messages:
+            return True
+        now_epoch = time.time()
+        try:
+            with self._lock, self.conn:
+                self.conn.executemany("INSERT INTO outbox (message, next_attempt, queued_at) VALUES (?, ?, ?)",
+                                      [(json.dumps(message), now_epoch, now_epoch) for message in messages])
+        except sqlite3.Error as e:
+            print(f"Error queueing notifications in {self.db_path}: {e}")
+            return False
+        for message in messages:
+            self.queued_ids.update(message['ids'])
+        self._update_outbox_flag()
         return True
-    except IOError as e:
-        print(f"Error writing to tracker file {tracker_file}: {e}")
+
+    def outbox_due(self, now_epoch):
+        """Return [(row_id, message, attempts, queued_at)] for every queued message whose next attempt is due.
+
+        The messages are claimed for OUTBOX_CLAIM_SECONDS, so an overlapping run doesn't
+        send them as well; delivered(), retry_later() or give_up() settle them before then,
+        and if this run dies they are simply due again afterwards.
+        """
+        with self.file_lock, self._lock, self.conn:
+            rows = self.conn.execute("SELECT id, message, attempts, queued_at FROM outbox WHERE next_attempt <= ? ORDER BY id",
+                                     (now_epoch,)).fetchall()
+            self.conn.executemany("UPDATE outbox SET next_attempt = ? WHERE id = ?",
+                                  [(now_epoch + OUTBOX_CLAIM_SECONDS, row[0]) for row in rows])
+        return [(row_id, json.loads(message_json), attempts, queued_at) for row_id, message_json, attempts, queued_at in rows]
+
+    def outbox_next_attempt(self):
+        """Return when the next queued message should be tried, or None if the outbox is empty."""
+        with self._lock:
+            return self.conn.execute("SELECT MIN(next_attempt) FROM outbox").fetchone()[0]
+
+    def delivered(self, rows):
+        """Move the IDs of delivered messages, given as [(row_id, message)], from the outbox to the sent table in one transaction."""
+        if not rows:
+            return
+        sent_at = int(time.time())
+        sent_ids = [task_id for _, message in rows for task_id in message['ids']]
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id, _ in rows])
+            self.conn.executemany("INSERT OR IGNORE INTO sent (id, sent_at) VALUES (?, ?)", [(task_id, sent_at) for task_id in sent_ids])
+        self.sent_ids.update(sent_ids)
+        self.queued_ids.difference_update(sent_ids)
+        self._update_outbox_flag()
+
+    def retry_later(self, row_id, attempts, next_attempt, error):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?", (attempts, next_attempt, error, row_id))
+
+    def give_up(self, row_id, message):
+        """Drop a message that can't be delivered; its IDs may be queued again while still due."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+        self.queued_ids.difference_update(message['ids'])
+        self._update_outbox_flag()
+
+    def _update_outbox_flag(self):
+        """Create or remove the flag file to match the outbox, which other processes may also have changed."""
+        try:
+            with self.file_lock:
+                with self._lock:
+                    outbox_empty = self.conn.execute("SELECT NOT EXISTS (SELECT 1 FROM outbox)").fetchone()[0]
+                if not outbox_empty:
+                    if not os.path.exists(self.outbox_flag_file):
+                        open(self.outbox_flag_file, 'w').close()
+                elif os.path.exists(self.outbox_flag_file):
+                    os.remove(self.outbox_flag_file)
+        except OSError as e:
+            print(f"Error updating outbox flag {self.outbox_flag_file}: {e}")
+
+    def close(self):
+        self.conn.close()
+
+def tracker_db_path(tracker_file):
+    """Return the SQLite tracker path for the configured tracker; a legacy .txt name maps to .sqlite3 next to it."""
+    root, ext = os.path.splitext(tracker_file)
+    return root + '.sqlite3' if ext == '.txt' else tracker_file
+
+def outbox_flag_path(tracker_file):
+    """Return the file that exists while the tracker's outbox holds undelivered messages."""
+    return tracker_db_path(tracker_file) + '.outbox'
+
+def should_send_notification(tracker, task_unique_id):
+    """Determine if the notification should be queued: it was neither delivered nor is it still waiting in the outbox."""
+    if task_unique_id in tracker:
+        log(f"Notification previously sent for event ID: {task_unique_id}.")
+        return False
+    if tracker.is_queued(task_unique_id):
+        log(f"Notification for event ID {task_unique_id} is already waiting in the outbox.")
         return False
+    return True
 
 def truncate_task_description(task_description, trunc_length):
     """Truncate the task description, preferring word boundaries."""
@@ -275,123 +1891,1012 @@ def truncate_task_description(task_description, trunc_length):
     last_space = truncated.rfind(' ')
     return truncated[:last_space] + "..." if last_space != -1 else truncated + "..."
 
-def main():
+def load_watermark(watermark_file):
+    """Return the epoch time of the last successful run, or None if there is none yet."""
+    try:
+        with open(watermark_file, 'r', encoding='utf-8') as f:
+            return float(json.load(f)['last_run'])
+    except FileNotFoundError:
+        return None
+    except (IOError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring unreadable run watermark {watermark_file}: {e}")
+        return None
+
+def save_watermark(watermark_file, run_epoch):
+    """Record a successful run via a temp file, so a crash never leaves a half-written watermark.
+
+    The read and the write share a lock and the watermark only moves forward, so a run
+    that finishes after a later-started one can't pull it back.
+    """
+    try:
+        with FileLock(f"{watermark_file}.lock"):
+            if (load_watermark(watermark_file) or 0) >= run_epoch:
+                return
+            _replace_file(watermark_file, json.dumps({'last_run': run_epoch}))
+    except IOError as e:
+        print(f"Error saving run watermark {watermark_file}: {e}")
+
+def catch_up_start(last_run_epoch, now_epoch, grace_seconds):
+    """Return where this run's window starts: at the last run, but no further back than the grace period."""
+    if last_run_epoch is None:
+        return now_epoch
+    return max(min(last_run_epoch, now_epoch), now_epoch - grace_seconds)
+
+def upcoming_occurrences(events, now_epoch, until_epoch, max_items):
+    """Return the task occurrences due from now_epoch to until_epoch, earliest first, at most max_items of them."""
+    occurrences = []
+    for event in events:
+        occurrence = upcoming_occurrence(event, now_epoch)
+        count = 0
+        while now_epoch <= occurrence.due <= until_epoch and count < max_items:
+            occurrences.append(occurrence)
+            count += 1
+            if not event.repeat:
+                break
+            occurrence = upcoming_occurrence(occurrence, occurrence.due + 1)
+    return heapq.nsmallest(max_items, occurrences, key=lambda occurrence: (occurrence.due, occurrence.key))
+
+def _ics_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def _ics_fold(line):
+    """Split an iCalendar content line into lines of at most 75 octets, continued with a leading space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return [line]
+    folded, current, current_bytes = [], '', 0
+    for char in line:
+        char_bytes = len(char.encode('utf-8'))
+        if current_bytes + char_bytes > 75:
+            folded.append(current)
+            current, current_bytes = ' ', 1
+        current += char
+        current_bytes += char_bytes
+    folded.append(current)
+    return folded
+
+def render_snapshot_ics(occurrences, stamp_epoch):
+    """Return the occurrences as an iCalendar file, one VEVENT each, times in UTC."""
+    def utc(epoch):
+        return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//logseq-notify//upcoming//EN", "CALSCALE:GREGORIAN"]
+    for occurrence in occurrences:
+        lines += ["BEGIN:VEVENT", f"UID:{occurrence.id}@logseq-notify", f"DTSTAMP:{utc(stamp_epoch)}",
+                  f"DTSTART:{utc(occurrence.due)}", f"SUMMARY:{_ics_text(occurrence.description)}",
+                  f"CATEGORIES:{occurrence.kind}"]
+        if occurrence.page:
+            lines.append(f"DESCRIPTION:{_ics_text(occurrence.page)}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return "".join(folded + "\r\n" for line in lines for folded in _ics_fold(line))
+
+def write_snapshot(events, snapshot_config, json_file, ics_file, now_epoch):
+    """Write the upcoming occurrences as JSON and iCalendar, unless the JSON already says the same.
+
+    The JSON holds no timestamp of its own, so it only differs when an occurrence
+    was added, changed, or fell out of the window. Returns whether the files were written.
+    """
+    days = snapshot_config.get('days') or SNAPSHOT_DAYS
+    max_items = snapshot_config.get('max_items') or SNAPSHOT_MAX_ITEMS
+    occurrences = upcoming_occurrences(events, now_epoch, now_epoch + days * 86400, max_items)
+    snapshot = {'version': 1, 'days': days, 'events': [
+        {'id': occurrence.id, 'due': occurrence.datetime.isoformat(timespec='minutes'), 'due_epoch': int(occurrence.due),
+         'kind': occurrence.kind, 'description': occurrence.description, 'page': occurrence.page,
+         'repeats': bool(occurrence.repeat)}
+        for occurrence in occurrences]}
+    content = json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')) + "\n"
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    try:
+        # The JSON goes last: if writing the calendar fails, the next run tries both again.
+        _replace_file(ics_file, render_snapshot_ics(occurrences, now_epoch))
+        _replace_file(json_file, content)
+    except OSError as e:
+        print(f"Error writing upcoming-events snapshot {json_file}: {e}")
+        return False
+    log(f"Upcoming-events snapshot updated with {len(occurrences)} tasks.")
+    return True
+
+def update_profile_snapshot(profile, events, now_epoch):
+    """Refresh a markdown profile's snapshot files if the profile has "snapshot" enabled."""
+    snapshot_config = profile['config'].get('snapshot') or {}
+    if profile['kind'] != 'markdown' or not snapshot_config.get('enabled') or events is None:
+        return
+    output_dir = profile['config']['output_dir']
+    with run_metrics().phase('snapshot'):
+        write_snapshot(events, snapshot_config, profile_file(output_dir, SNAPSHOT_JSON_FILE_NAME, profile['name']),
+                       profile_file(output_dir, SNAPSHOT_ICS_FILE_NAME, profile['name']), now_epoch)
+
+def collect_markdown_events(paths_config, parse_cache_file, not_before=None, changed_names=None):
+    """Return the scheduled events of the configured markdown source, or None if it can't be read.
+
+    Files that can't produce a reminder at or after not_before are left out (see scan_markdown_files).
+    """
+    graph_root = paths_config.get('graph_root')
+    if graph_root:
+        return scan_graph(graph_root, parse_cache_file, paths_config.get('scan_workers'), not_before, changed_names)
+    markdown_file = paths_config.get('markdown')
+    events, failed_paths = scan_markdown_files([(markdown_file, None)], parse_cache_file, 1, not_before)
+    if failed_paths:
+        print(f"Could not read markdown file {markdown_file}. Aborting.")
+        return None
+    return events
+
+def _db_backend():
+    """Import the DB-graph backend from dbTest/ on first use."""
+    if DB_BACKEND_DIR not in sys.path:
+        sys.path.insert(0, DB_BACKEND_DIR)
+    import mainDB
+    return mainDB
+
+def collect_db_events(paths_config, window_start_epoch, window_end_epoch):
+    """Return the DB graph's open tasks due inside the window as TaskRecords, or None if the database can't be read."""
+    backend = _db_backend()
+    metrics = run_metrics()
+    read_start = time.perf_counter()
+    schema = backend.get_db_schema(paths_config)
+    conn = backend.open_db_readonly(paths_config.get('database_path'), schema)
+    if conn is None:
+        return None
+    try:
+        events = []
+        tasks = backend.fetch_tasks_from_db(conn, schema, datetime.fromtimestamp(window_start_epoch), datetime.fromtimestamp(window_end_epoch))
+        for task in tasks:
+            # The backend's IDs end in the due minute, which TaskRecord.id adds back.
+            key = task['id'].rsplit('_', 1)[0]
+            kind = 'DEADLINE' if key.startswith('db_deadline_') else 'SCHEDULED'
+            events.append(TaskRecord(None, 0, 0, None, kind, task['datetime'].timestamp(), None, task['description'], key))
+        metrics.count('events', len(events))
+        return events
+    except backend.sqlite3.Error as e:
+        # A failed read must not look like an empty window, or the watermark would skip past these tasks.
+        print(f"SQLite error when querying DB at '{paths_config.get('database_path')}': {e}")
+        return None
+    finally:
+        conn.close()
+        metrics.add_time('read', time.perf_counter() - read_start)
+
+def collect_profile_events(profile, now_epoch):
+    """Return (profile, events) for one prepared profile; events is None if its source couldn't be read."""
+    paths_config = profile['config']
+    if profile['kind'] == 'db':
+        # Only tasks that have a reminder inside the window, at any lead time, are fetched.
+        window_end = now_epoch + profile['resolve_leads'].max_lead + NOTIFY_WINDOW_SECONDS
+        return profile, collect_db_events(paths_config, profile['window_start'], window_end)
+    return profile, collect_markdown_events(paths_config, profile['parse_cache_file'], profile['window_start'])
+
+def collect_all_profile_events(profiles, now_epoch):
+    """Read every profile's source concurrently, so a run takes about as long as its slowest graph."""
+    # cProfile only sees the thread it was enabled in, so a profiled run reads the profiles in turn.
+    if len(profiles) <= 1 or run_metrics().file_costs is not None:
+        return [collect_profile_events(profile, now_epoch) for profile in profiles]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(profiles)) as pool:
+        return list(pool.map(collect_profile_events, profiles, [now_epoch] * len(profiles)))
+
+def format_lead_time(seconds):
+    """Return a lead time as a short text such as 1d, 2h or 15m."""
+    for unit in ('w', 'd', 'h', 'm'):
+        if seconds % LEAD_TIME_UNITS[unit] == 0:
+            return f"{seconds // LEAD_TIME_UNITS[unit]}{unit}"
+    return f"{seconds}s"
+
+def build_event_notification(event, ntfy_topic, ntfy_server=None, settings=None):
+    """Return the ntfy message for one due reminder; one for a task already past due says it was missed.
+
+    settings are the event's rule settings, which may replace the topic, priority and tags.
+    """
+    settings = settings or {}
+    notif_body_desc = truncate_task_description(event.description, 100)
+    if event.due < time.time():
+        return {
+            'topic': settings.get('topic', ntfy_topic),
+            'server': ntfy_server,
+            'title': 'Missed Task Reminder',
+            'body': f"{notif_body_desc} was due at {event.datetime.strftime('%H:%M')}.",
+            'priority': settings.get('priority', "high"),
+            'tags': settings.get('tags', "warning,markdown"),
+            'ids': [event.id],
+        }
+    if event.lead:
+        due_format = '%H:%M' if event.datetime.date() == datetime.now().date() else '%a %d %b %H:%M'
+        details_for_body = f"{notif_body_desc} is due in {format_lead_time(event.lead)}, at {event.datetime.strftime(due_format)}!"
+    else:
+        details_for_body = f"{notif_body_desc} is due at {event.datetime.strftime('%H:%M')}!"
+    return {
+        'topic': settings.get('topic', ntfy_topic),
+        'server': ntfy_server,
+        'title': 'Task Reminder',
+        'body': details_for_body,
+        'priority': settings.get('priority', "high"),
+        'tags': settings.get('tags', "alarm_clock,markdown"),
+        'ids': [event.id],
+    }
+
+def build_digest_notification(events, ntfy_topic, ntfy_server=None, settings=None):
+    """Return one ntfy message listing several events that fall due together and share their rule settings."""
+    settings = settings or {}
+    now_epoch = time.time()
+    lines = [f"{event.datetime.strftime('%H:%M')} {truncate_task_description(event.description, 80)}{' (missed)' if event.due < now_epoch else ''}"
+             for event in events]
+    return {
+        'topic': settings.get('topic', ntfy_topic),
+        'server': ntfy_server,
+        'title': f"{len(events)} Tasks Due",
+        'body': "\n".join(lines),
+        'priority': settings.get('priority', "high"),
+        'tags': settings.get('tags', "alarm_clock,markdown"),
+        'ids': [event.id for event in events],
+    }
+
+def coalesce_due_events(due_events, ntfy_topic, ntfy_server, digest_config, rules=None):
+    """Group events due in the same digest window into digest messages of at most max_items each.
+
+    Events whose rules send them to another topic, priority or tags are grouped
+    separately. A window holding a single event still gets the regular per-task message.
+    """
+    window_seconds = digest_config.get('window_seconds') or DIGEST_WINDOW_SECONDS
+    max_items = max(digest_config.get('max_items') or DIGEST_MAX_ITEMS, 1)
+    windows = {}
+    for event in sorted(due_events, key=lambda e: e.due):
+        settings = rules.settings(event) if rules else {}
+        group = (int(event.due // window_seconds), settings.get('topic'), settings.get('priority'), settings.get('tags'))
+        windows.setdefault(group, (settings, []))[1].append(event)
+    messages = []
+    for settings, window_events in windows.values():
+        for start in range(0, len(window_events), max_items):
+            chunk = window_events[start:start + max_items]
+            if len(chunk) == 1:
+                messages.append(build_event_notification(chunk[0], ntfy_topic, ntfy_server, settings))
+            else:
+                messages.append(build_digest_notification(chunk, ntfy_topic, ntfy_server, settings))
+    return messages
+
+def queue_due_events(due_events, tracker, paths_config, rules=None):
+    """Store the messages for due events that were neither sent nor queued yet in the tracker's outbox.
+
+    Nothing is sent here, so this finishes in the same time whatever the network
+    is doing; deliver_outbox() sends the messages. Returns how many were queued, or
+    None if the outbox could not be written, in which case nothing was queued.
+    """
+    ntfy_topic = paths_config.get('ntfy_topic')
+    ntfy_server = paths_config.get('ntfy_server')
+    metrics = run_metrics()
+    metrics.count('reminders_due', len(due_events))
+    dedupe_start = time.perf_counter()
+    # Held from the check to the write, so an overlapping run can't queue the same events in between.
+    with tracker.file_lock:
+        tracker.refresh()
+        unsent_events = {}
+        for event in due_events:
+            log(f"Markdown Task '{event.description[:50]}...' scheduled for {event.datetime.strftime('%Y-%m-%d %H:%M')} is due soon.")
+            # The daemon may hand in a reminder twice: once retried and once again from a rebuilt heap.
+            if event.id not in unsent_events and should_send_notification(tracker, event.id):
+                unsent_events[event.id] = event
+        unsent_events = list(unsent_events.values())
+
+        digest_config = paths_config.get('digest') or {}
+        if digest_config.get('enabled'):
+            messages = coalesce_due_events(unsent_events, ntfy_topic, ntfy_server, digest_config, rules)
+        else:
+            messages = [build_event_notification(event, ntfy_topic, ntfy_server, rules.settings(event) if rules else None)
+                        for event in unsent_events]
+        # All messages, digest members included, go to the outbox in a single write.
+        queued = tracker.enqueue(messages)
+    metrics.add_time('dedupe', time.perf_counter() - dedupe_start)
+    return len(messages) if queued else None
+
+def outbox_retry_delay(attempts):
+    """Return how long to wait before the next delivery pass for a message that failed attempts passes so far."""
+    return min(OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1), OUTBOX_MAX_RETRY_SECONDS)
+
+def deliver_outbox(trackers, workers=NTFY_SEND_WORKERS):
+    """Send every outbox message whose next attempt is due, for several profiles' trackers at once.
+
+    A message is marked as sent only after the server answered 2xx. Otherwise it
+    stays queued with a doubling retry delay, until it is older than the maximum
+    age or the server rejected it outright (4xx other than 429).
+    Returns (delivered, still queued).
+    """
+    metrics = run_metrics()
+    now_epoch = time.time()
+    batch = []
+    for tracker in trackers:
+        for row_id, message, attempts, queued_at in tracker.outbox_due(now_epoch):
+            if now_epoch - queued_at > OUTBOX_MAX_AGE_SECONDS:
+                print(f"Giving up on notification for event ID(s) {', '.join(message['ids'])}: undelivered for over {OUTBOX_MAX_AGE_SECONDS // 3600} hours.")
+                tracker.give_up(row_id, message)
+                metrics.count('notifications_expired')
+                continue
+            batch.append((tracker, row_id, message, attempts))
+    if not batch:
+        return 0, 0
+
+    with metrics.phase('dispatch'):
+        results = send_ntfy_batch([message for _, _, message, _ in batch], workers, OUTBOX_SEND_ATTEMPTS)
+    delivered_rows = {tracker: [] for tracker in trackers}
+    for (tracker, row_id, message, attempts), result in zip(batch, results):
+        metrics.count('send_attempts', result['attempts'])
+        if not result['attempts'] and result['retry_after'] is not None:
+            # Never sent: the rate limit had no slot for it in this pass.
+            tracker.retry_later(row_id, attempts, time.time() + result['retry_after'], result['error'])
+            metrics.count('notifications_deferred')
+            continue
+        metrics.send_latencies.append(result['seconds'])
+        if result['ok']:
+            delivered_rows[tracker].append((row_id, message))
+            metrics.count('notifications_sent')
+            continue
+        metrics.count('notifications_failed')
+        status = result['status']
+        if status is not None and 400 <= status < 500 and status != 429:
+            print(f"Notification for event ID(s) {', '.join(message['ids'])} was rejected: {result['error']}")
+            tracker.give_up(row_id, message)
+            continue
+        attempts += 1
+        retry_at = time.time() + max(outbox_retry_delay(attempts), result['retry_after'] or 0)
+        print(f"Notification for event ID(s) {', '.join(message['ids'])} failed: {result['error']}; "
+              f"retrying after {datetime.fromtimestamp(retry_at).strftime('%H:%M:%S')}.")
+        tracker.retry_later(row_id, attempts, retry_at, result['error'])
+    # One transaction per tracker records everything this pass delivered.
+    for tracker, rows in delivered_rows.items():
+        tracker.delivered(rows)
+    delivered = sum(len(rows) for rows in delivered_rows.values())
+    return delivered, len(batch) - delivered
+
+class OutboxWorker(threading.Thread):
+    """Background thread of the daemon that drains the outbox, sleeping until the next retry is due."""
+
+    def __init__(self, tracker, workers=NTFY_SEND_WORKERS):
+        super().__init__(name='outbox', daemon=True)
+        self.tracker = tracker
+        self.workers = workers
+        self.wake = threading.Event()
+        self.stopping = False
+
+    def run(self):
+        while not self.stopping:
+            self.wake.clear()
+            deliver_outbox([self.tracker], self.workers)
+            next_attempt = self.tracker.outbox_next_attempt()
+            timeout = None if next_attempt is None else max(next_attempt - time.time(), 0.1)
+            self.wake.wait(timeout)
+
+    def stop(self):
+        self.stopping = True
+        self.wake.set()
+        self.join()
+
+def _query_api_handler(unix_socket):
+    """Return the HTTP request handler class of the query API; http.server is only imported when the API is on."""
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlsplit, parse_qs
+
+    class QueryAPIHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes; without this, Nagle plus delayed ACKs adds ~40 ms per reply.
+        disable_nagle_algorithm = not unix_socket
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, payload = self.server.api.answer(url.path, {name: values[-1] for name, values in parse_qs(url.query).items()})
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            return 'unix-socket' if unix_socket else super().address_string()
+
+        def log_message(self, format, *args):
+            log(f"Query API: {format % args}")
+
+    return QueryAPIHandler
+
+class QueryAPI:
+    """Answers local queries from the daemon's in-memory reminders and tracker, over loopback HTTP or a Unix socket.
+
+    GET /next?n=N lists the next N reminders, GET /due?minutes=M those to be sent
+    within M minutes, and GET /sent?id=ID tells whether a reminder was sent or is
+    queued. Lookups are a bisect into a DueIndex and set membership in the tracker,
+    so nothing is parsed or read from disk per query.
+    """
+
+    def __init__(self, api_config, tracker, resolve_leads):
+        import socketserver
+        from http.server import ThreadingHTTPServer
+        self.tracker = tracker
+        self.resolve_leads = resolve_leads
+        self.events = []
+        self.due_index = DueIndex([])
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+        self.socket_path = api_config.get('socket')
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                # Left over from a daemon that didn't shut down cleanly.
+                os.remove(self.socket_path)
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, _query_api_handler(True))
+            address = self.socket_path
+        else:
+            self.server = ThreadingHTTPServer(('127.0.0.1', int(api_config.get('port', 0))), _query_api_handler(False))
+            address = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.server.daemon_threads = True
+        self.server.api = self
+        threading.Thread(target=self.server.serve_forever, name='query-api', daemon=True).start()
+        log(f"Query API listening on {address}.")
+
+    def update(self, events, now_epoch=None):
+        """Index the reminders of a freshly loaded event list."""
+        now_epoch = time.time() if now_epoch is None else now_epoch
+        due_index = DueIndex(upcoming_reminders(events, self.resolve_leads, now_epoch, now_epoch + QUERY_API_INDEX_DAYS * 86400))
+        with self._lock:
+            self.events, self.due_index, self.built_at = events, due_index, now_epoch
+
+    def current_index(self, now_epoch):
+        if now_epoch - self.built_at >= QUERY_API_REFRESH_SECONDS:
+            self.update(self.events, now_epoch)
+        return self.due_index
+
+    def describe(self, reminder):
+        return {'id': reminder.id, 'description': reminder.description, 'page': reminder.page,
+                'due': reminder.datetime.isoformat(timespec='minutes'), 'due_epoch': int(reminder.due),
+                'notify_epoch': int(reminder.notify_at), 'lead_seconds': reminder.lead,
+                'sent': reminder.id in self.tracker, 'queued': self.tracker.is_queued(reminder.id)}
+
+    def answer(self, path, query):
+        """Return (HTTP status, JSON-able payload) for one query."""
+        now_epoch = time.time()
+        try:
+            if path == '/next':
+                count = min(int(query.get('n', 5)), QUERY_API_MAX_ITEMS)
+                due_index = self.current_index(now_epoch)
+                start = bisect.bisect_left(due_index.times, now_epoch)
+                return 200, {'reminders': [self.describe(reminder) for reminder in due_index.reminders[start:start + count]]}
+            if path == '/due':
+                minutes = float(query.get('minutes', NOTIFY_WINDOW_SECONDS / 60))
+                reminders = self.current_index(now_epoch).between(now_epoch, now_epoch + minutes * 60)
+                return 200, {'reminders': [self.describe(reminder) for reminder in reminders[:QUERY_API_MAX_ITEMS]]}
+            if path == '/sent':
+                task_id = query.get('id')
+                if not task_id:
+                    return 400, {'error': "missing id"}
+                return 200, {'id': task_id, 'sent': task_id in self.tracker, 'queued': self.tracker.is_queued(task_id)}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        return 404, {'error': "unknown query; use /next?n=N, /due?minutes=M or /sent?id=ID"}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+def markdown_watch_targets(paths_config):
+    """Return (directories to watch, file names to react to or None for any .md file)."""
+    graph_root = paths_config.get('graph_root')
+    if graph_root:
+        watch_dirs = []
+        for sub_dir in GRAPH_SCAN_DIRS:
+            for current_dir, dir_names, _ in os.walk(os.path.join(graph_root, sub_dir)):
+                dir_names[:] = [d for d in dir_names if not d.startswith('.')]
+                watch_dirs.append(current_dir)
+        return watch_dirs, None
+    markdown_file = os.path.abspath(paths_config.get('markdown'))
+    return [os.path.dirname(markdown_file)], {os.path.basename(markdown_file)}
+
+def open_inotify_watcher(watch_dirs):
+    """Return an inotify file descriptor watching the given directories, or None where inotify is unavailable."""
+    if not hasattr(select, 'select') or not os.path.exists('/proc/sys/fs/inotify'):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        inotify_fd = libc.inotify_init1(INOTIFY_FLAGS)
+        if inotify_fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for watch_dir in watch_dirs:
+            if libc.inotify_add_watch(inotify_fd, os.fsencode(watch_dir), INOTIFY_WATCH_MASK) < 0:
+                os.close(inotify_fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {watch_dir}")
+        return inotify_fd
+    except (OSError, AttributeError) as e:
+        log(f"inotify unavailable ({e}); falling back to stat polling.")
+        return None
+
+def _read_inotify_names(inotify_fd):
+    """Drain pending inotify events and return the file names they refer to."""
+    names = set()
+    while True:
+        try:
+            buffer = os.read(inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(buffer):
+            _, _, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            names.add(os.fsdecode(buffer[offset:offset + name_length].rstrip(b'\0')))
+            offset += name_length
+
+def markdown_source_signature(paths_config):
+    """Return a cheap stat-only fingerprint of the markdown source, used when inotify is unavailable."""
+    graph_root = paths_config.get('graph_root')
+    files = find_graph_markdown_files(graph_root) if graph_root else [(paths_config.get('markdown'), None)]
+    signature = []
+    for path, _ in files:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return signature
+
+def build_event_heap(events, resolve_leads, now_epoch):
+    """Return a min-heap of (wake_at, sequence, reminder) for the next reminder of every lead time of every event."""
+    heap = [(reminder.notify_at - NOTIFY_WINDOW_SECONDS, next(_heap_sequence), reminder)
+            for reminder in upcoming_reminders(events, resolve_leads, now_epoch)]
+    heapq.heapify(heap)
+    return heap
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run_daemon(profile, tracker):
+    """Keep events in memory and sleep until the next deadline or the next change to the markdown source.
+
+    Reminders that fell due while the device was suspended are still sent, as missed
+    ones, if they are within the grace period; the same goes for the time since the
+    daemon last ran.
+    """
+    paths_config = profile['config']
+    parse_cache_file = profile['parse_cache_file']
+    poll_seconds = paths_config.get('daemon_poll_seconds') or DAEMON_POLL_SECONDS
+    grace_seconds = paths_config.get('missed_grace_seconds', MISSED_GRACE_SECONDS)
+
+    # systemctl stop and kill send SIGTERM; shut down through the same cleanup as Ctrl+C, even during start-up.
+    import signal
+    previous_sigterm_handler = signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    inotify_fd = None
+    query_api = None
+    outbox_worker = None
+    try:
+        watch_dirs, watch_names = markdown_watch_targets(paths_config)
+        inotify_fd = open_inotify_watcher(watch_dirs)
+        last_signature = None if inotify_fd is not None else markdown_source_signature(paths_config)
+        log(f"Daemon started; watching {len(watch_dirs)} directories with {'inotify' if inotify_fd is not None else f'stat polling every {poll_seconds}s'}.")
+
+        start_epoch = catch_up_start(load_watermark(profile['watermark_file']), time.time(), grace_seconds)
+        events = collect_markdown_events(paths_config, parse_cache_file, start_epoch)
+        resolve_leads = profile['resolve_leads']
+        heap = build_event_heap(events or [], resolve_leads, start_epoch)
+        log(f"Daemon loaded {len(heap)} upcoming reminders.")
+        if paths_config.get('query_api'):
+            try:
+                query_api = QueryAPI(paths_config['query_api'], tracker, resolve_leads)
+                query_api.update(events or [])
+            except OSError as e:
+                print(f"Could not start the query API: {e}. Continuing without it.")
+        outbox_worker = OutboxWorker(tracker, paths_config.get('send_workers') or NTFY_SEND_WORKERS)
+        outbox_worker.start()
+
+        # Due reminders whose outbox write failed; they are off the heap, so they are kept here until queued.
+        unqueued = []
+        while True:
+            now_epoch = time.time()
+            due_events = [reminder for reminder in unqueued if reminder.notify_at >= now_epoch - grace_seconds]
+            while heap and heap[0][0] <= now_epoch:
+                _, _, reminder = heapq.heappop(heap)
+                if reminder.notify_at >= now_epoch - grace_seconds:
+                    due_events.append(reminder)
+                following = reminder.following(now_epoch)
+                if following is not None:
+                    heapq.heappush(heap, (following.notify_at - NOTIFY_WINDOW_SECONDS, next(_heap_sequence), following))
+            queued = queue_due_events(due_events, tracker, paths_config, profile['rules']) if due_events else 0
+            if queued is None:
+                # The watermark stays put too, so even a restart still catches up on them.
+                unqueued = due_events
+                print(f"Could not queue {len(due_events)} due reminders; retrying in {DAEMON_QUEUE_RETRY_SECONDS} seconds.")
+            else:
+                unqueued = []
+                if queued:
+                    outbox_worker.wake.set()
+                save_watermark(profile['watermark_file'], now_epoch)
+            update_profile_snapshot(profile, events, now_epoch)
+
+            sleep_seconds = min(heap[0][0] - now_epoch, DAEMON_MAX_SLEEP_SECONDS) if heap else DAEMON_MAX_SLEEP_SECONDS
+            if unqueued:
+                sleep_seconds = min(sleep_seconds, DAEMON_QUEUE_RETRY_SECONDS)
+            source_changed = False
+            changed_names = set()
+            if inotify_fd is not None:
+                readable, _, _ = select.select([inotify_fd], [], [], max(sleep_seconds, 0))
+                if readable:
+                    # Editors and Logseq write in several steps; let the burst settle before re-parsing.
+                    time.sleep(DAEMON_CHANGE_SETTLE_SECONDS)
+                    changed_names = _read_inotify_names(inotify_fd)
+                    if watch_names is None:
+                        source_changed = any(name.endswith('.md') for name in changed_names)
+                    else:
+                        source_changed = bool(changed_names & watch_names)
+            else:
+                time.sleep(max(min(sleep_seconds, poll_seconds), 0))
+                signature = markdown_source_signature(paths_config)
+                source_changed = signature != last_signature
+                changed_names = {os.path.basename(path) for path, *_ in set(signature).symmetric_difference(last_signature)}
+                last_signature = signature
+
+            if source_changed:
+                # A settled journal page that was just edited is re-read now, not at the next daily check.
+                events = collect_markdown_events(paths_config, parse_cache_file, time.time() - grace_seconds, changed_names)
+                if events is not None:
+                    heap = build_event_heap(events, resolve_leads, time.time())
+                    log(f"Markdown source changed; daemon reloaded {len(heap)} upcoming reminders.")
+                    if query_api is not None:
+                        query_api.update(events)
+    except KeyboardInterrupt:
+        print("Daemon interrupted; shutting down.")
+        return 0
+    finally:
+        signal.signal(signal.SIGTERM, previous_sigterm_handler)
+        if outbox_worker is not None:
+            outbox_worker.stop()
+        if query_api is not None:
+            query_api.close()
+        if inotify_fd is not None:
+            os.close(inotify_fd)
+
+def prepare_profile(name, paths_config, config_path):
+    """Check one profile's settings and create its output directory.
+
+    Returns {'name', 'kind', 'config', 'rules', 'resolve_leads', 'parse_cache_file',
+    'watermark_file'}, or None after reporting what is wrong with the profile.
+    """
+    kind = 'db' if paths_config.get('database_path') else 'markdown'
+    markdown_file = paths_config.get('markdown')
+    graph_root = paths_config.get('graph_root')
+    output_dir = paths_config.get('output_dir')
+    notification_tracker_file = paths_config.get('notification_tracker')
+    ntfy_topic = paths_config.get('ntfy_topic')
+
+    if kind == 'db':
+        log(f"[{name}] Using DB graph: {paths_config.get('database_path')}")
+    elif graph_root:
+        log(f"[{name}] Using graph root: {graph_root}")
+    else:
+        log(f"[{name}] Using Markdown file: {markdown_file}")
+    log(f"[{name}] Using Output directory (for tracker): {output_dir}")
+    log(f"[{name}] Using Notification tracker file: {notification_tracker_file}")
+    log(f"[{name}] Using ntfy.sh topic: {ntfy_topic}")
+
+    if not all([markdown_file or graph_root or kind == 'db', output_dir, notification_tracker_file, ntfy_topic]):
+        print(f"Essential configuration of profile '{name}' is missing (markdown, graph_root or database_path, output_dir, ntfy_topic, or notification_tracker). Skipping it.")
+        return None
+
+    try:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+            log(f"Created output directory: {output_dir}")
+    except OSError as e:
+        print(f"Error creating output directory {output_dir} of profile '{name}': {e}. Skipping it.")
+        return None
+
+    if kind == 'db':
+        if not os.path.exists(paths_config['database_path']):
+            print(f"Database not found at {paths_config['database_path']} (profile '{name}'). Skipping it.")
+            print(f"Please ensure the 'database_path' path in your configuration file ('{config_path}') is correct.")
+            return None
+    elif graph_root and not os.path.isdir(graph_root):
+        print(f"Graph root not found at {graph_root} (profile '{name}'). Skipping it.")
+        print(f"Please ensure the 'graph_root' path in your configuration file ('{config_path}') is correct.")
+        return None
+    elif not graph_root and not os.path.exists(markdown_file):
+        print(f"Markdown file not found at {markdown_file} (profile '{name}'). Skipping it.")
+        print(f"Please ensure the 'markdown' path in your configuration file ('{config_path}') is correct.")
+        return None
+
+    rules = NotificationRules(paths_config.get('rules') or [])
+    return {'name': name, 'kind': kind, 'config': paths_config, 'rules': rules, 'resolve_leads': lead_time_resolver(paths_config, rules),
+            'parse_cache_file': profile_file(output_dir, PARSE_CACHE_FILE_NAME, name),
+            'watermark_file': profile_file(output_dir, WATERMARK_FILE_NAME, name)}
+
+def acquire_run_lock(profile, mode):
+    """Take a profile's single-instance lock for a 'run' or the 'daemon'; returns (proceed, lock).
+
+    When another process holds it, this one should leave the profile alone, unless that
+    is a run (not a daemon) that started more than RUN_LOCK_STALE_SECONDS ago and is
+    presumably hung; then it proceeds without the lock, which the tracker's own locking
+    makes safe. lock is the FileLock to release when done, or None.
+    """
+    lock = FileLock(profile_file(profile['config']['output_dir'], RUN_LOCK_FILE_NAME, profile['name']))
+    try:
+        if lock.acquire(blocking=False):
+            lock.file.truncate(0)
+            lock.file.write(json.dumps({'pid': os.getpid(), 'started': time.time(), 'mode': mode}))
+            lock.file.flush()
+            return True, lock
+        with open(lock.path, 'r', encoding='utf-8') as f:
+            holder_text = f.read()
+    except OSError as e:
+        print(f"Could not check whether profile '{profile['name']}' is already being processed ({e}); continuing.")
+        return True, None
+    try:
+        holder = json.loads(holder_text)
+    except ValueError:
+        # The holder is still writing its details, so it has only just started.
+        holder = {}
+    held_seconds = time.time() - holder.get('started', time.time())
+    if holder.get('mode') != 'daemon' and held_seconds > RUN_LOCK_STALE_SECONDS:
+        print(f"Profile '{profile['name']}' has been locked by process {holder.get('pid')} for {held_seconds / 60:.0f} minutes; "
+              f"assuming it is stuck and continuing.")
+        return True, None
+    return False, None
+
+def profile_file(output_dir, file_name, profile_name):
+    """Return the path of one of a profile's data files; profiles may share an output_dir, so only the default keeps the plain name."""
+    if profile_name != 'default':
+        root, ext = os.path.splitext(file_name)
+        file_name = f"{root}_{profile_name}{ext}"
+    return os.path.join(output_dir, file_name)
+
+def parse_args(argv=None):
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Send ntfy.sh reminders for scheduled Logseq Markdown tasks.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="keep running and notify at each deadline instead of doing a single cron-style pass")
+    parser.add_argument('--config', metavar='PATH',
+                        help="use this config file instead of searching the default locations")
+    parser.add_argument('--only', metavar='PROFILE', action='append',
+                        help="process only this profile from \"paths\" (repeatable); by default every profile runs")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile the run with cProfile and tracemalloc and print the slowest files and functions")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="print progress output (also enabled by LOGSEQ_NOTIFY_VERBOSE=1)")
+    return parser.parse_args(argv)
+
+def open_tracker(paths_config):
+    """Open the profile's notification tracker, or return None after reporting why it failed."""
+    import sqlite3
+    notification_tracker_file = paths_config.get('notification_tracker')
+    try:
+        tracker = NotificationTracker(notification_tracker_file, paths_config.get('tracker_retention_days', TRACKER_RETENTION_DAYS))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error opening notification tracker {notification_tracker_file}: {e}. Aborting.")
+        return None
+    log(f"Loaded {len(tracker)} previously sent event IDs from {tracker.db_path}.")
+    return tracker
+
+def write_metrics(metrics, metrics_config, output_dir, exit_code):
+    """Export one run's metrics: append a JSON line, or replace the Prometheus textfile atomically."""
+    metrics_format = metrics_config.get('format', 'jsonl')
+    latency = metrics.latency_summary()
+    if metrics_format == 'prometheus':
+        metrics_file = metrics_config.get('file') or os.path.join(output_dir, METRICS_PROMETHEUS_FILE_NAME)
+        lines = [f"# HELP {METRICS_PREFIX}_phase_seconds Time spent in each phase of the last run.",
+                 f"# TYPE {METRICS_PREFIX}_phase_seconds gauge"]
+        lines += [f'{METRICS_PREFIX}_phase_seconds{{phase="{phase}"}} {seconds:.6f}' for phase, seconds in sorted(metrics.phases.items())]
+        lines += [f"# HELP {METRICS_PREFIX}_items Files, lines, events and notifications handled by the last run.",
+                  f"# TYPE {METRICS_PREFIX}_items gauge"]
+        lines += [f'{METRICS_PREFIX}_items{{kind="{name}"}} {value}' for name, value in sorted(metrics.counts.items())]
+        lines += [f"# HELP {METRICS_PREFIX}_send_latency_seconds ntfy send latency of the last run, retries included.",
+                  f"# TYPE {METRICS_PREFIX}_send_latency_seconds gauge"]
+        lines += [f'{METRICS_PREFIX}_send_latency_seconds{{stat="{stat}"}} {value:.6f}' for stat, value in latency.items() if stat != 'count']
+        lines += [f"# TYPE {METRICS_PREFIX}_last_run_exit_code gauge", f"{METRICS_PREFIX}_last_run_exit_code {exit_code}",
+                  f"# TYPE {METRICS_PREFIX}_last_run_timestamp_seconds gauge", f"{METRICS_PREFIX}_last_run_timestamp_seconds {metrics.started:.3f}"]
+        try:
+            _replace_file(metrics_file, "\n".join(lines) + "\n")
+        except IOError as e:
+            print(f"Error writing metrics to {metrics_file}: {e}")
+        return
+    metrics_file = metrics_config.get('file') or os.path.join(output_dir, METRICS_JSONL_FILE_NAME)
+    record = {
+        'time': datetime.fromtimestamp(metrics.started).isoformat(timespec='seconds'),
+        'exit_code': exit_code,
+        'duration_seconds': round(time.time() - metrics.started, 6),
+        'phases': {phase: round(seconds, 6) for phase, seconds in metrics.phases.items()},
+        'counts': metrics.counts,
+        'send_latency_seconds': {stat: round(value, 6) for stat, value in latency.items()},
+    }
+    try:
+        # A single short append per run; lines from overlapping runs don't interleave.
+        with open(metrics_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, separators=(',', ':')) + "\n")
+    except IOError as e:
+        print(f"Error writing metrics to {metrics_file}: {e}")
+
+def write_profile_report(profiler, metrics, stats_file=None):
+    """Stop profiling and print files ranked by time and peak allocation, and this script's functions by cumulative time."""
+    # Stop first, so the report's own imports don't show up in it.
+    profiler.disable()
+    import pstats
+    import tracemalloc
+    run_peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rows = PROFILE_REPORT_ROWS
+    file_costs = metrics.file_costs
+    print(f"--- Profile: {len(file_costs)} files read, peak traced memory {run_peak_bytes / 1024:.0f} KiB ---")
+    if file_costs:
+        print("Slowest files (read + parse):")
+        for path, seconds, peak_bytes, line_count in sorted(file_costs, key=lambda cost: cost[1], reverse=True)[:rows]:
+            print(f"  {seconds * 1000:9.2f} ms  {peak_bytes / 1024:9.0f} KiB  {line_count:7} lines  {path}")
+        print("Largest files by peak allocation:")
+        for path, seconds, peak_bytes, line_count in sorted(file_costs, key=lambda cost: cost[2], reverse=True)[:rows]:
+            print(f"  {peak_bytes / 1024:9.0f} KiB  {seconds * 1000:9.2f} ms  {line_count:7} lines  {path}")
+    stats = pstats.Stats(profiler)
+    own_functions = []
+    script_file = os.path.abspath(__file__)
+    for (file_name, line_number, function_name), (_, call_count, own_seconds, cumulative_seconds, _) in stats.stats.items():
+        if os.path.abspath(file_name) == script_file:
+            location = f"{os.path.basename(script_file)}:{line_number}"
+            own_functions.append((cumulative_seconds, own_seconds, call_count, function_name, location))
+    print("Functions by cumulative time:")
+    for cumulative_seconds, own_seconds, call_count, function_name, location in sorted(own_functions, reverse=True)[:rows]:
+        print(f"  {cumulative_seconds * 1000:9.2f} ms  {own_seconds * 1000:9.2f} ms own  {call_count:8} calls  {function_name} ({location})")
+    if stats_file:
+        try:
+            stats.dump_stats(stats_file)
+            print(f"Full profile saved to {stats_file} (browse it with: python -m pstats {stats_file})")
+        except OSError as e:
+            print(f"Error writing profile to {stats_file}: {e}")
+
+def main(argv=None):
+    global VERBOSE, _run_metrics
+    args = parse_args(argv)
+    _run_metrics = metrics = RunMetrics()
+    VERBOSE = VERBOSE or args.verbose
+    profiler = None
+    profile_stats_file = None
+    if args.profile:
+        import cProfile
+        import tracemalloc
+        metrics.file_costs = []
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
     if IS_TERMUX: 
+        import subprocess
         try:
-            print("Attempting to acquire Termux wakelock...")
+            log("Attempting to acquire Termux wakelock...")
             subprocess.run(['termux-wake-lock'], check=True, timeout=5)
-            print("Termux wakelock acquired.")
+            log("Termux wakelock acquired.")
         except Exception as e:
-            print(f"Wakelock attempt failed (this is often ignorable if script is short or battery optimization is off for Termux): {e}")
+            log(f"Wakelock attempt failed (this is often ignorable if script is short or battery optimization is off for Termux): {e}")
 
     actual_exit_code = 1
+    metrics_export = None
+    run_locks = []
     try:
-        print(f"--- Logseq Markdown ntfy.sh Task Reminder ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ---")
+        log(f"--- Logseq Markdown ntfy.sh Task Reminder ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ---")
         
-        config, config_path = load_config() 
-        if config is None or config_path is None: 
+        config_start = time.perf_counter()
+        config_path = locate_config(args.config)
+        if config_path is None:
             print("Critical error: Failed to load or create Markdown configuration. Aborting.")
             return 1
+        # Read, fill in and save the config under one lock, so an overlapping run can't save
+        # its own copy in between and have its change overwritten by ours.
+        with config_lock(config_path):
+            config = read_config(config_path)
+            if config is None:
+                print("Critical error: Failed to load or create Markdown configuration. Aborting.")
+                return 1
+            # Only write the config back when prompting or path derivation actually changed it.
+            loaded_config_snapshot = json.dumps(config, sort_keys=True)
 
-        paths_config = get_task_file_paths(config, IS_TERMUX) 
-        
-        if not paths_config.get('markdown') or \
-           not paths_config.get('output_dir') or \
-           not paths_config.get('ntfy_topic') or \
-           not paths_config.get('notification_tracker'):
-            print("Essential Markdown configuration is missing after setup attempt (markdown, output_dir, ntfy_topic, or notification_tracker). Aborting.")
-            save_config(config, config_path) 
+            profiles_config = get_profiles(config, IS_TERMUX, args.only)
+            if json.dumps(config, sort_keys=True) != loaded_config_snapshot:
+                save_config(config, config_path)
+        configure_rate_limit(config.get('rate_limit'))
+
+        profiles = []
+        for profile_name, paths_config in profiles_config.items():
+            profile = prepare_profile(profile_name, paths_config, config_path)
+            if profile is not None:
+                profiles.append(profile)
+        metrics.add_time('config', time.perf_counter() - config_start)
+        if not profiles:
             return 1
-        save_config(config, config_path) 
+        if profiler is not None:
+            profile_stats_file = os.path.join(profiles[0]['config']['output_dir'], PROFILE_STATS_FILE_NAME)
+        if config.get('metrics') and not args.daemon:
+            metrics_export = (config['metrics'], profiles[0]['config']['output_dir'])
+        metrics.count('profiles', len(profiles))
+        # A broken profile is reported and skipped; the others still run, but the exit code says something failed.
+        profiles_failed = len(profiles) < len(profiles_config) or bool(args.only and len(profiles_config) < len(set(args.only)))
 
-        markdown_file = paths_config.get('markdown')
-        output_dir = paths_config.get('output_dir')
-        notification_tracker_file = paths_config.get('notification_tracker')
-        ntfy_topic = paths_config.get('ntfy_topic')
+        if args.daemon:
+            if len(profiles) != 1 or profiles[0]['kind'] != 'markdown':
+                print("Daemon mode runs a single markdown profile; choose one with --only NAME. Aborting.")
+                return 1
+            proceed, run_lock = acquire_run_lock(profiles[0], 'daemon')
+            if not proceed:
+                print(f"Profile '{profiles[0]['name']}' is already being processed by another instance. Aborting.")
+                return 1
+            if run_lock is not None:
+                run_locks.append(run_lock)
+            paths_config = profiles[0]['config']
+            tracker = open_tracker(paths_config)
+            if tracker is None:
+                return 1
+            try:
+                actual_exit_code = run_daemon(profiles[0], tracker)
+            finally:
+                tracker.close()
+            return actual_exit_code
 
-        print(f"Using Markdown file: {markdown_file}")
-        print(f"Using Output directory (for tracker): {output_dir}")
-        print(f"Using Notification tracker file: {notification_tracker_file}")
-        print(f"Using ntfy.sh topic: {ntfy_topic}")
-        
-        if not all([markdown_file, output_dir, notification_tracker_file, ntfy_topic]):
-            print("Critical path configuration or ntfy_topic is missing or empty. Aborting.")
-            return 1
-            
-        try:
-            if not os.path.exists(output_dir) and output_dir != "":
-                os.makedirs(output_dir, exist_ok=True)
-                print(f"Created output directory: {output_dir}")
-        except OSError as e:
-            print(f"Error creating output directory {output_dir}: {e}. Aborting.")
-            return 1
-            
-        now = datetime.now()
-        
-        if not os.path.exists(markdown_file):
-            print(f"Markdown file not found at {markdown_file}. Aborting.")
-            print(f"Please ensure the 'markdown' path in your configuration file ('{config_path}') is correct.")
-            return 1
-        
+        # Overlapping runs (a slow run still going when cron or Tasker starts the next) leave each other's profiles alone.
+        idle_profiles = []
+        for profile in profiles:
+            proceed, run_lock = acquire_run_lock(profile, 'run')
+            if run_lock is not None:
+                run_locks.append(run_lock)
+            if proceed:
+                idle_profiles.append(profile)
+            else:
+                log(f"Profile '{profile['name']}' is still being processed by an earlier run; skipping it this time.")
+                metrics.count('profiles_busy')
+        profiles = idle_profiles
+
+        now_epoch = time.time()
+        for profile in profiles:
+            # Cover everything since the last run, so a delayed or skipped run (Android Doze) loses nothing.
+            grace_seconds = profile['config'].get('missed_grace_seconds', MISSED_GRACE_SECONDS)
+            profile['window_start'] = catch_up_start(load_watermark(profile['watermark_file']), now_epoch, grace_seconds)
+        trackers = []
+        completed_profiles = []
+        send_workers = NTFY_SEND_WORKERS
         try:
-            with open(markdown_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-        except IOError as e:
-            print(f"Error reading markdown file {markdown_file}: {e}. Aborting.")
+            for profile, notifications_to_send in collect_all_profile_events(profiles, now_epoch):
+                if notifications_to_send is None:
+                    profiles_failed = True
+                    continue
+                paths_config = profile['config']
+                log(f"Found {len(notifications_to_send)} potential scheduled events in profile '{profile['name']}'.")
+                update_profile_snapshot(profile, notifications_to_send, now_epoch)
+
+                window_start = profile['window_start']
+                window_end = now_epoch + NOTIFY_WINDOW_SECONDS
+                if window_start < now_epoch:
+                    log(f"Catching up on reminders since {datetime.fromtimestamp(window_start).strftime('%Y-%m-%d %H:%M:%S')}.")
+                with metrics.phase('index'):
+                    due_events = due_reminders(notifications_to_send, profile['resolve_leads'], window_start, window_end)
+                # Most runs have nothing due and nothing left to retry; those never touch the tracker database at all.
+                if not due_events and not os.path.exists(outbox_flag_path(paths_config['notification_tracker'])):
+                    completed_profiles.append(profile)
+                    continue
+                with metrics.phase('dedupe'):
+                    tracker = open_tracker(paths_config)
+                if tracker is None:
+                    profiles_failed = True
+                    continue
+                trackers.append(tracker)
+                if queue_due_events(due_events, tracker, paths_config, profile['rules']) is None:
+                    # Left out of completed_profiles, so the watermark stays and the next run catches up on these.
+                    profiles_failed = True
+                    continue
+                send_workers = max(send_workers, paths_config.get('send_workers') or 0)
+                completed_profiles.append(profile)
+            # Everything due is safely queued now, so the watermark can move on before any network I/O.
+            for profile in completed_profiles:
+                save_watermark(profile['watermark_file'], now_epoch)
+            # Every profile's outbox is drained through one pool and one set of connections.
+            _, still_queued = deliver_outbox(trackers, send_workers)
+            if still_queued:
+                log(f"{still_queued} notifications stay in the outbox and are retried on a later run.")
+        finally:
+            for tracker in trackers:
+                tracker.close()
+        if profiles_failed:
             return 1
         
-        notifications_to_send = []
-        current_task_desc = None
-        current_task_line_number = 0 
-
-        for i, line_content_raw in enumerate(lines):
-            line_content_stripped = line_content_raw.strip()
-            task_match = parse_task_line(line_content_stripped)
-            if task_match:
-                current_task_desc = task_match
-                current_task_line_number = i + 1 
-            
-            if 'SCHEDULED:' in line_content_stripped.upper() and current_task_desc:
-                s_date_str, s_time_str = parse_scheduled_line(line_content_stripped)
-                if s_date_str:
-                    try:
-                        full_datetime_str = f'{s_date_str} {s_time_str}'
-                        scheduled_dt_obj = datetime.strptime(full_datetime_str, '%Y-%m-%d %H:%M')
-                        sanitized_task_desc_part = re.sub(r'[^\w\s-]', '', current_task_desc).strip().replace(' ', '_')[:30]
-                        event_unique_id = f"logseq_md_event_{current_task_line_number}_{sanitized_task_desc_part}_{scheduled_dt_obj.strftime('%Y%m%d%H%M')}"
-                        notifications_to_send.append({
-                            'description': current_task_desc,
-                            'datetime': scheduled_dt_obj,
-                            'id': event_unique_id
-                        })
-                    except ValueError as e:
-                        print(f"Warning: Could not parse date/time for task '{current_task_desc}' (line ~{i+1}): {e}. Line: '{line_content_stripped}'")
-            elif not line_content_stripped.startswith((" ", "\t", "-", "SCHEDULED:")) and not task_match and "SCHEDULED:" not in line_content_stripped.upper():
-                current_task_desc = None
-
-
-        print(f"Found {len(notifications_to_send)} potential scheduled events from Markdown.")
-
-        for event in notifications_to_send:
-            original_task_desc = event['description']
-            scheduled_date_time_obj = event['datetime']
-            task_id = event['id']
-        
-            if scheduled_date_time_obj:
-                time_difference_seconds = (scheduled_date_time_obj - now).total_seconds()
-                
-                if 0 <= time_difference_seconds <= 300: 
-                    print(f"Markdown Task '{original_task_desc[:50]}...' scheduled for {scheduled_date_time_obj.strftime('%Y-%m-%d %H:%M')} is due soon.")
-                    if should_send_notification(notification_tracker_file, task_id):
-                        ntfy_title_header = 'Task Reminder'
-                        notif_body_desc = truncate_task_description(original_task_desc, 100)
-                        details_for_body = f"{notif_body_desc} is due at {scheduled_date_time_obj.strftime('%H:%M')}!"
-                        ntfy_message_body = f"{details_for_body}"
-                        send_ntfy_notification(ntfy_topic, ntfy_title_header, ntfy_message_body, priority="high", tags="alarm_clock,markdown")
-                    else:
-                        print(f"Notification for Markdown task ID {task_id} already sent or failed to mark.")
-        
-        print("--- Markdown Script finished processing. ---")
+        log("--- Markdown Script finished processing. ---")
         actual_exit_code = 0
     
     except Exception as e:
@@ -400,15 +2905,23 @@ def main():
         traceback.print_exc()
         actual_exit_code = 1
     finally:
+        close_ntfy_connections()
+        for run_lock in run_locks:
+            run_lock.release()
+        if metrics_export is not None:
+            write_metrics(metrics, metrics_export[0], metrics_export[1], actual_exit_code)
+        if profiler is not None:
+            write_profile_report(profiler, metrics, profile_stats_file)
         if IS_TERMUX: 
+            import subprocess
             try:
-                print("Attempting to release Termux wakelock...")
+                log("Attempting to release Termux wakelock...")
                 subprocess.run(['termux-wake-unlock'], check=False, timeout=5) 
-                print("Termux wakelock release attempted.")
+                log("Termux wakelock release attempted.")
             except Exception as e:
-                print(f"Wakelock release attempt failed: {e}")
+                log(f"Wakelock release attempt failed: {e}")
         
-        print(f"Script exiting with code: {actual_exit_code}")
+        log(f"Script exiting with code: {actual_exit_code}")
         return actual_exit_code
 
 if __name__ == '__main__':
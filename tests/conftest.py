@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (REPO_DIR, os.path.join(REPO_DIR, 'dbTest'), os.path.join(REPO_DIR, 'bench')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def stub_server():
+    """Start stub ntfy servers (see bench/bench_notifier.py) and return their URLs; all are shut down afterwards."""
+    import bench_notifier
+    import main
+    servers = []
+
+    def start(burst=0, per_second=0):
+        server = bench_notifier.start_stub_server(burst, per_second)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    main.configure_rate_limit(False)
+    yield start
+    main.close_ntfy_connections()
+    main.configure_rate_limit(None)
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def markdown_profile(tmp_path, stub_server):
+    """Return a function that writes a one-task profile sending to a stub server; it returns (config path, watermark file)."""
+    import main
+
+    def write(due, watermark_epoch=None, **settings):
+        markdown_file = tmp_path / 'Tasks.md'
+        markdown_file.write_text(f"- TODO Water the plants\n  SCHEDULED: <{due:%Y-%m-%d %a %H:%M}>\n")
+        output_dir = tmp_path / 'out'
+        output_dir.mkdir(exist_ok=True)
+        watermark_file = str(output_dir / main.WATERMARK_FILE_NAME)
+        if watermark_epoch is not None:
+            main.save_watermark(watermark_file, watermark_epoch)
+        config_path = tmp_path / 'config_markdown.json'
+        config_path.write_text(json.dumps({'paths': {'default': {
+            'markdown': str(markdown_file), 'output_dir': str(output_dir), 'ntfy_topic': 'test', 'ntfy_server': stub_server(),
+            'notification_tracker': str(output_dir / 'notification_tracker_markdown.sqlite3'), **settings}}}))
+        return str(config_path), watermark_file
+
+    return write
@@ -0,0 +1,26 @@
+import main
+
+
+def parse(text, page='pages/Tasks.md'):
+    return main.parse_markdown_lines(text.splitlines(True), page)
+
+
+def test_reworded_task_keeps_its_key():
+    old = parse("- TODO Pay rent\n  SCHEDULED: <2026-10-20 Tue 09:00>\n")
+    new = parse("- TODO Pay the rent for May\n  SCHEDULED: <2026-10-20 Tue 09:00>\n")
+    assert main.carry_over_block_keys(old, new) == 1
+    assert new[0].key == old[0].key
+
+
+def test_moved_task_with_typo_fix_keeps_its_key():
+    old = parse("- TODO Submit the quartely report\n  SCHEDULED: <2026-10-20 Tue 09:00>\n")
+    new = parse("- TODO Submit the quarterly report\n  SCHEDULED: <2026-10-21 Wed 09:00>\n")
+    assert main.carry_over_block_keys(old, new) == 1
+    assert new[0].key == old[0].key
+
+
+def test_replaced_task_at_same_time_gets_a_new_key():
+    old = parse("- TODO Pay rent\n  SCHEDULED: <2026-10-20 Tue 09:00>\n")
+    new = parse("- TODO Walk dog\n  SCHEDULED: <2026-10-20 Tue 09:00>\n")
+    assert main.carry_over_block_keys(old, new) == 0
+    assert new[0].key != old[0].key
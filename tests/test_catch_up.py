@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import bench_notifier
+import main
+
+StubNtfyHandler = bench_notifier.StubNtfyHandler
+
+
+def test_catch_up_start():
+    now = 100000.0
+    assert main.catch_up_start(None, now, 3600) == now
+    assert main.catch_up_start(now - 600, now, 3600) == now - 600
+    assert main.catch_up_start(now - 7200, now, 3600) == now - 3600
+    assert main.catch_up_start(now - 600, now, 0) == now
+    # A watermark from the future (the clock was turned back) never moves the window past now.
+    assert main.catch_up_start(now + 600, now, 3600) == now
+
+
+def test_watermark_round_trip(tmp_path, capsys):
+    watermark_file = str(tmp_path / main.WATERMARK_FILE_NAME)
+    assert main.load_watermark(watermark_file) is None
+    main.save_watermark(watermark_file, 1234.5)
+    assert main.load_watermark(watermark_file) == 1234.5
+    (tmp_path / main.WATERMARK_FILE_NAME).write_text("{not json")
+    assert main.load_watermark(watermark_file) is None
+    assert "Ignoring unreadable run watermark" in capsys.readouterr().out
+
+
+def test_missed_reminder_within_grace_is_sent(markdown_profile):
+    now = datetime.now()
+    config_path, watermark_file = markdown_profile(now - timedelta(minutes=30), (now - timedelta(hours=2)).timestamp())
+    assert main.main(['--config', config_path]) == 0
+    assert StubNtfyHandler.received == 1
+    assert main.load_watermark(watermark_file) >= now.timestamp()
+
+
+def test_missed_reminder_beyond_grace_is_dropped(markdown_profile):
+    now = datetime.now()
+    config_path, watermark_file = markdown_profile(now - timedelta(minutes=90), (now - timedelta(hours=2)).timestamp())
+    assert main.main(['--config', config_path]) == 0
+    assert StubNtfyHandler.received == 0
+    assert main.load_watermark(watermark_file) >= now.timestamp()
+
+
+def test_zero_grace_sends_no_missed_reminders(markdown_profile):
+    now = datetime.now()
+    config_path, _ = markdown_profile(now - timedelta(minutes=10), (now - timedelta(minutes=30)).timestamp(), missed_grace_seconds=0)
+    assert main.main(['--config', config_path]) == 0
+    assert StubNtfyHandler.received == 0
+
+
+def test_first_run_sends_nothing_missed(markdown_profile):
+    now = datetime.now()
+    config_path, _ = markdown_profile(now - timedelta(minutes=10))
+    assert main.main(['--config', config_path]) == 0
+    assert StubNtfyHandler.received == 0
+    config_path, _ = markdown_profile(now + timedelta(minutes=2))
+    assert main.main(['--config', config_path]) == 0
+    assert StubNtfyHandler.received == 1
+
+
+def test_watermark_stays_when_queueing_fails(markdown_profile, monkeypatch):
+    now = datetime.now()
+    last_run = (now - timedelta(minutes=30)).timestamp()
+    config_path, watermark_file = markdown_profile(now - timedelta(minutes=10), last_run)
+    monkeypatch.setattr(main.NotificationTracker, 'enqueue', lambda tracker, messages: not messages)
+    assert main.main(['--config', config_path]) == 1
+    assert main.load_watermark(watermark_file) == last_run
@@ -0,0 +1,34 @@
+import json
+import signal
+import subprocess
+import sys
+import time
+
+import main
+
+
+def test_sigterm_shuts_the_daemon_down_cleanly(tmp_path):
+    markdown_file = tmp_path / 'Tasks.md'
+    markdown_file.write_text("- TODO Far away task\n  SCHEDULED: <2099-01-01 Thu 09:00>\n", encoding='utf-8')
+    socket_path = tmp_path / 'query.sock'
+    config_path = tmp_path / main.CONFIG_FILE_NAME
+    config_path.write_text(json.dumps({'paths': {'default': {
+        'markdown': str(markdown_file), 'output_dir': str(tmp_path), 'ntfy_topic': 'test',
+        'ntfy_server': 'http://127.0.0.1:9', 'query_api': {'socket': str(socket_path)},
+    }}}), encoding='utf-8')
+    daemon = subprocess.Popen([sys.executable, main.__file__, '--daemon', '--config', str(config_path)],
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        deadline = time.monotonic() + 10
+        while not socket_path.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert socket_path.exists()
+        daemon.send_signal(signal.SIGTERM)
+        output, _ = daemon.communicate(timeout=10)
+    finally:
+        if daemon.poll() is None:
+            daemon.kill()
+    assert daemon.returncode == 0, output
+    assert "shutting down" in output
+    # The query API's socket is removed by the cleanup that SIGTERM used to skip.
+    assert not socket_path.exists()
@@ -0,0 +1,88 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import main
+import mainDB
+import make_fixture_db
+
+
+def fixture_db(tmp_path, blocks=2000, due_now=5):
+    db_path = str(tmp_path / 'graph.sqlite3')
+    due_soon = make_fixture_db.create_fixture(db_path, blocks, 10.0, due_now, seed=1)
+    return db_path, due_soon
+
+
+def kvs_db(tmp_path):
+    """A file in the layout of a real Logseq DB graph: datascript storage in a key/value table."""
+    db_path = str(tmp_path / 'logseq.sqlite3')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE kvs (addr INTEGER PRIMARY KEY, content TEXT, addresses JSON)")
+    conn.execute("INSERT INTO kvs VALUES (0, '[\"^ \",\"~:max-tx\",536870913]', NULL)")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_window_query_finds_due_tasks(tmp_path):
+    db_path, due_soon = fixture_db(tmp_path)
+    schema = mainDB.get_db_schema({})
+    conn = mainDB.open_db_readonly(db_path, schema)
+    try:
+        now = datetime.now()
+        tasks = list(mainDB.fetch_tasks_from_db(conn, schema, now, now + timedelta(seconds=mainDB.NOTIFY_WINDOW_SECONDS)))
+    finally:
+        conn.close()
+    assert due_soon == 5
+    assert len(tasks) == due_soon
+    assert all(task['description'].startswith('Fixture task') for task in tasks)
+    assert len({task['id'] for task in tasks}) == len(tasks)
+
+
+def test_window_query_uses_indexes(tmp_path):
+    db_path, _ = fixture_db(tmp_path)
+    schema = mainDB.get_db_schema({})
+    conn = mainDB.open_db_readonly(db_path, schema)
+    try:
+        query = mainDB.build_task_window_query(schema)
+        parameters = [0, 0, *schema['markers']] * (query.count(" UNION ALL ") + 1)
+        plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query, parameters)]
+    finally:
+        conn.close()
+    scans = [detail for detail in plan if detail.startswith('SCAN') and 'INDEX' not in detail]
+    assert not scans, plan
+
+
+def test_kvs_layout_is_refused_at_open(tmp_path, capsys):
+    assert mainDB.open_db_readonly(kvs_db(tmp_path), mainDB.get_db_schema({})) is None
+    assert "datascript" in capsys.readouterr().out
+
+
+def test_missing_column_is_refused_at_open(tmp_path, capsys):
+    db_path, _ = fixture_db(tmp_path, blocks=10)
+    schema = mainDB.get_db_schema({'db_schema': {'deadline_column': 'due'}})
+    assert mainDB.open_db_readonly(db_path, schema) is None
+    assert "no column due" in capsys.readouterr().out
+
+
+def test_collect_db_events_fails_on_query_error(tmp_path, monkeypatch):
+    db_path, _ = fixture_db(tmp_path, blocks=10)
+
+    def failing_fetch(conn, schema, window_start, window_end):
+        raise sqlite3.OperationalError("database is locked")
+        yield
+
+    monkeypatch.setattr(mainDB, 'fetch_tasks_from_db', failing_fetch)
+    now = time.time()
+    assert main.collect_db_events({'database_path': db_path}, now, now + 300) is None
+
+
+def test_unreadable_db_profile_keeps_its_watermark(tmp_path):
+    output_dir = tmp_path / 'out'
+    config_path = tmp_path / 'config_markdown.json'
+    config_path.write_text(json.dumps({'paths': {'default': {
+        'database_path': kvs_db(tmp_path), 'output_dir': str(output_dir), 'ntfy_topic': 'test'}}}))
+    assert main.main(['--config', str(config_path)]) == 1
+    assert not os.path.exists(output_dir / main.WATERMARK_FILE_NAME)
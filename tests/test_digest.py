@@ -0,0 +1,51 @@
+import time
+
+import main
+
+
+def reminder(index, due, description=None, page='pages/Inbox'):
+    event = main.TaskRecord(page, index, 0, 'TODO', 'SCHEDULED', due, None, description or f"task {index}", f"k{index}")
+    return main.Reminder(event, 0)
+
+
+def window_start(window_seconds):
+    """The start of a digest window an hour from now."""
+    return (int(time.time() // window_seconds) + 12) * window_seconds
+
+
+def test_events_in_one_window_share_a_digest():
+    start = window_start(300)
+    reminders = [reminder(0, start + 10), reminder(1, start + 200), reminder(2, start + 400), reminder(3, start + 450)]
+    messages = main.coalesce_due_events(reminders, 'topic', None, {'enabled': True, 'window_seconds': 300})
+    assert [message['ids'] for message in messages] == [[reminders[0].id, reminders[1].id], [reminders[2].id, reminders[3].id]]
+    assert all(message['title'] == "2 Tasks Due" for message in messages)
+    assert messages[0]['body'].splitlines()[1].endswith("task 1")
+
+
+def test_digests_are_split_at_max_items():
+    start = window_start(300)
+    reminders = [reminder(index, start + index) for index in range(5)]
+    messages = main.coalesce_due_events(reminders, 'topic', None, {'window_seconds': 300, 'max_items': 2})
+    assert [len(message['ids']) for message in messages] == [2, 2, 1]
+    assert messages[-1]['title'] == 'Task Reminder'
+
+
+def test_a_window_with_one_event_gets_a_regular_reminder():
+    start = window_start(300)
+    only = reminder(0, start + 10)
+    [message] = main.coalesce_due_events([only], 'topic', None, {'window_seconds': 300})
+    assert message == main.build_event_notification(only, 'topic', None, {})
+
+
+def test_rules_that_change_topic_or_priority_get_their_own_digest():
+    rules = main.NotificationRules([{'match': {'tag': 'work'}, 'topic': 'work'},
+                                    {'match': {'priority': 'A'}, 'priority': 'urgent'}])
+    start = window_start(300)
+    reminders = [reminder(0, start + 1, "water plants"), reminder(1, start + 2, "buy milk"),
+                 reminder(2, start + 3, "report #work"), reminder(3, start + 4, "review #work"),
+                 reminder(4, start + 5, "[#A] taxes"), reminder(5, start + 6, "[#A] passport")]
+    messages = main.coalesce_due_events(reminders, 'default', None, {'window_seconds': 300}, rules)
+    groups = {(message['topic'], message['priority']): message['ids'] for message in messages}
+    assert groups == {('default', 'high'): [reminders[0].id, reminders[1].id],
+                      ('work', 'high'): [reminders[2].id, reminders[3].id],
+                      ('default', 'urgent'): [reminders[4].id, reminders[5].id]}
@@ -0,0 +1,26 @@
+import random
+import time
+
+import main
+
+
+def random_events(rng, count, now_epoch):
+    events = []
+    for index in range(count):
+        due = now_epoch + rng.randint(-40, 40) * 3600 + rng.choice([0, 30, 90, 240])
+        repeat = rng.choice([None, None, None, (1, 'd'), (2, 'h'), (1, 'w')])
+        leads = rng.choice([None, None, (0, 900), (86400,)])
+        events.append(main.TaskRecord('pages/x.md', index, 0, 'TODO', 'SCHEDULED', due, repeat, f"task {index}", f"k{index}", leads))
+    return events
+
+
+def test_due_reminders_match_the_index():
+    rng = random.Random(3)
+    now_epoch = time.time()
+    resolve_leads = main.lead_time_resolver({'lead_times': ['0', '1h']})
+    events = random_events(rng, 3000, now_epoch)
+    for start_epoch, end_epoch in ((now_epoch, now_epoch + 300), (now_epoch - 7200, now_epoch + 300), (now_epoch, now_epoch + 3 * 86400)):
+        expected = main.DueIndex(main.upcoming_reminders(events, resolve_leads, start_epoch, end_epoch)).between(start_epoch, end_epoch)
+        found = main.due_reminders(events, resolve_leads, start_epoch, end_epoch)
+        assert sorted(reminder.id for reminder in found) == sorted(reminder.id for reminder in expected)
+        assert [reminder.notify_at for reminder in found] == sorted(reminder.notify_at for reminder in found)
@@ -0,0 +1,55 @@
+import fcntl
+import json
+import multiprocessing
+import threading
+
+import pytest
+
+import main
+
+
+def add_profile(config_path, name):
+    with main.config_lock(config_path):
+        config = main.read_config(config_path)
+        config['profiles'][name] = {}
+        main.save_config(config, config_path)
+
+
+def test_overlapping_config_updates_are_all_kept(tmp_path):
+    config_path = str(tmp_path / 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'profiles': {}}, f)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=add_profile, args=(config_path, f"p{n}")) for n in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert sorted(main.read_config(config_path)['profiles']) == [f"p{n}" for n in range(8)]
+
+
+def test_watermark_never_moves_back(tmp_path):
+    watermark_file = str(tmp_path / 'last_run.json')
+    main.save_watermark(watermark_file, 200.0)
+    main.save_watermark(watermark_file, 100.0)
+    assert main.load_watermark(watermark_file) == 200.0
+    main.save_watermark(watermark_file, 300.0)
+    assert main.load_watermark(watermark_file) == 300.0
+
+
+def test_failed_flock_releases_the_thread_lock(tmp_path, monkeypatch):
+    def failing_flock(fd, operation):
+        raise OSError(37, "No locks available")
+
+    lock = main.FileLock(str(tmp_path / 'test.lock'))
+    monkeypatch.setattr(fcntl, 'flock', failing_flock)
+    with pytest.raises(OSError):
+        lock.acquire()
+    assert lock.file is None
+    monkeypatch.undo()
+
+    acquired = []
+    worker = threading.Thread(target=lambda: acquired.append(lock.acquire(blocking=False)))
+    worker.start()
+    worker.join()
+    assert acquired == [True]
@@ -0,0 +1,63 @@
+import json
+import re
+
+import main
+
+_SAMPLE_RE = re.compile(r'([a-z_]+)(?:\{([a-z_]+)="([^"\\]*)"\})? (-?\d+(?:\.\d+)?)')
+
+
+def sample_metrics():
+    metrics = main.RunMetrics()
+    metrics.add_time('parse', 0.25)
+    metrics.add_time('parse', 0.5)
+    with metrics.phase('dispatch'):
+        pass
+    metrics.count('files', 3)
+    metrics.count('notifications_sent')
+    metrics.send_latencies.extend([0.2, 0.1, 0.4])
+    return metrics
+
+
+def test_jsonl_appends_one_record_per_run(tmp_path):
+    metrics = sample_metrics()
+    main.write_metrics(metrics, {}, str(tmp_path), 0)
+    main.write_metrics(metrics, {'format': 'jsonl'}, str(tmp_path), 1)
+    with open(tmp_path / main.METRICS_JSONL_FILE_NAME, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['exit_code'] for record in records] == [0, 1]
+    record = records[0]
+    assert set(record) == {'time', 'exit_code', 'duration_seconds', 'phases', 'counts', 'send_latency_seconds'}
+    assert record['phases']['parse'] == 0.75 and 'dispatch' in record['phases']
+    assert record['counts'] == {'files': 3, 'notifications_sent': 1}
+    assert record['send_latency_seconds'] == {'count': 3, 'mean': 0.233333, 'p50': 0.2, 'p95': 0.4, 'max': 0.4}
+
+
+def test_prometheus_textfile_format(tmp_path):
+    metrics_file = tmp_path / 'notifier.prom'
+    main.write_metrics(sample_metrics(), {'format': 'prometheus', 'file': str(metrics_file)}, str(tmp_path), 0)
+    main.write_metrics(sample_metrics(), {'format': 'prometheus', 'file': str(metrics_file)}, str(tmp_path), 2)
+    text = metrics_file.read_text()
+    assert text.endswith("\n")
+    typed = set()
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            name, metric_type = line[7:].split(' ')
+            assert metric_type == 'gauge'
+            typed.add(name)
+        elif line.startswith('# HELP '):
+            assert line.split(' ')[2].startswith(main.METRICS_PREFIX)
+        else:
+            match = _SAMPLE_RE.fullmatch(line)
+            assert match, line
+            name, label, value, number = match.groups()
+            assert name in typed, f"{name} has no TYPE line before its samples"
+            samples[(name, value)] = float(number)
+    prefix = main.METRICS_PREFIX
+    # The file is replaced, not appended to: only the second run is in it.
+    assert sum(line.startswith(f"{prefix}_last_run_exit_code ") for line in text.splitlines()) == 1
+    assert samples[(f"{prefix}_last_run_exit_code", None)] == 2
+    assert samples[(f"{prefix}_phase_seconds", 'parse')] == 0.75
+    assert samples[(f"{prefix}_items", 'files')] == 3
+    assert samples[(f"{prefix}_send_latency_seconds", 'p95')] == 0.4
+    assert (f"{prefix}_send_latency_seconds", 'count') not in samples
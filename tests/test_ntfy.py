@@ -0,0 +1,88 @@
+import time
+
+import bench_notifier
+import main
+
+StubNtfyHandler = bench_notifier.StubNtfyHandler
+
+
+def message(server_url, topic='test', task_id='logseq_md_event_test_202610200900'):
+    return {'topic': topic, 'server': server_url, 'title': 'Task Reminder', 'body': 'Test is due!', 'ids': [task_id]}
+
+
+def test_connection_is_kept_alive(stub_server):
+    server_url = stub_server()
+    results = main.send_ntfy_batch([message(server_url, task_id=f"id_{index}") for index in range(5)], workers=1)
+    assert all(result['ok'] for result in results)
+    assert StubNtfyHandler.received == 5
+    assert StubNtfyHandler.connections == 1
+
+
+def test_outbox_retries_after_server_error(stub_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'NTFY_BACKOFF_SECONDS', 0.01)
+    server_url = stub_server()
+    tracker_file = str(tmp_path / 'notification_tracker_markdown.sqlite3')
+    tracker = main.NotificationTracker(tracker_file)
+    try:
+        tracker.enqueue([message(server_url)])
+        StubNtfyHandler.fail_next = main.OUTBOX_SEND_ATTEMPTS
+        assert main.deliver_outbox([tracker], workers=1) == (0, 1)
+        assert 'logseq_md_event_test_202610200900' not in tracker
+        assert tracker.outbox_next_attempt() > time.time()
+        assert main.deliver_outbox([tracker], workers=1) == (0, 0)
+
+        # Make the retry due now instead of in OUTBOX_RETRY_SECONDS.
+        with tracker.conn:
+            tracker.conn.execute("UPDATE outbox SET next_attempt = 0")
+        assert main.deliver_outbox([tracker], workers=1) == (1, 0)
+        assert 'logseq_md_event_test_202610200900' in tracker
+        assert tracker.outbox_next_attempt() is None
+        assert not main.os.path.exists(main.outbox_flag_path(tracker_file))
+    finally:
+        tracker.close()
+    assert StubNtfyHandler.received == 1
+
+
+def test_token_bucket_limits_each_topic(stub_server):
+    server_url = stub_server()
+    main.configure_rate_limit({'burst': 2, 'per_second': 10})
+    start = time.monotonic()
+    results = main.send_ntfy_batch([message(server_url, 'busy', f"busy_{index}") for index in range(4)]
+                                   + [message(server_url, 'quiet', f"quiet_{index}") for index in range(2)], workers=1)
+    elapsed = time.monotonic() - start
+    assert all(result['ok'] for result in results)
+    # Two of the busy topic's four sends wait a tenth of a second each; the quiet topic never waits.
+    assert 0.15 <= elapsed < 1.0
+    assert main.rate_limiter(server_url, 'busy').wait_time() > 0
+    assert main.rate_limiter(server_url, 'quiet').wait_time() == 0
+
+
+def test_token_bucket_defers_beyond_max_wait(stub_server):
+    server_url = stub_server()
+    main.configure_rate_limit({'burst': 1, 'per_second': 0.01})
+    assert main.send_ntfy_notification('test', 'Title', 'first', server=server_url, max_wait=1)['ok']
+    result = main.send_ntfy_notification('test', 'Title', 'second', server=server_url, max_wait=1)
+    assert not result['ok'] and result['attempts'] == 0
+    assert 99 <= result['retry_after'] <= 100
+    assert StubNtfyHandler.received == 1
+
+
+def test_retry_after_is_honoured(stub_server):
+    server_url = stub_server(burst=1, per_second=1)
+    main.configure_rate_limit({'burst': 10, 'per_second': 10})
+    assert main.send_ntfy_notification('test', 'Title', 'first', server=server_url)['ok']
+    result = main.send_ntfy_notification('test', 'Title', 'second', server=server_url)
+    assert result['ok'] and result['attempts'] == 2
+    # The 429 said Retry-After: 1, and the paused limiter held the retry back that long.
+    assert result['seconds'] >= 0.9
+    assert StubNtfyHandler.rejected == 1
+
+
+def test_long_retry_after_defers_the_message(stub_server):
+    server_url = stub_server(burst=1, per_second=0.1)
+    main.configure_rate_limit({'burst': 10, 'per_second': 10})
+    assert main.send_ntfy_notification('test', 'Title', 'first', server=server_url)['ok']
+    result = main.send_ntfy_notification('test', 'Title', 'second', server=server_url, max_wait=2)
+    assert not result['ok'] and result['status'] == 429
+    assert result['retry_after'] == 10
+    assert main.rate_limiter(server_url, 'test').wait_time() > 9
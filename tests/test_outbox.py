@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import bench_notifier
+import main
+
+StubNtfyHandler = bench_notifier.StubNtfyHandler
+
+
+def test_failed_enqueue_keeps_the_watermark_and_fails_the_run(markdown_profile, monkeypatch):
+    last_run = (datetime.now() - timedelta(minutes=30)).timestamp()
+    config_path, watermark_file = markdown_profile(datetime.now() - timedelta(minutes=10), last_run)
+    real_enqueue = main.NotificationTracker.enqueue
+    monkeypatch.setattr(main.NotificationTracker, 'enqueue', lambda tracker, messages: not messages)
+    assert main.main(['--config', config_path]) == 1
+    assert main.load_watermark(watermark_file) == last_run
+    assert StubNtfyHandler.received == 0
+
+    # The next run still covers the reminder, now as a missed one.
+    monkeypatch.setattr(main.NotificationTracker, 'enqueue', real_enqueue)
+    assert main.main(['--config', config_path]) == 0
+    assert main.load_watermark(watermark_file) > last_run
+    assert StubNtfyHandler.received == 1
+
+
+def test_daemon_retries_reminders_it_could_not_queue(markdown_profile, monkeypatch):
+    last_run = (datetime.now() - timedelta(minutes=30)).timestamp()
+    config_path, watermark_file = markdown_profile(datetime.now() - timedelta(minutes=10), last_run)
+    paths_config = main.read_config(config_path)['paths']['default']
+    profile = main.prepare_profile('default', paths_config, config_path)
+    monkeypatch.setattr(main, 'DAEMON_QUEUE_RETRY_SECONDS', 0.05)
+    real_queue_due_events = main.queue_due_events
+    queued_ids = []
+    watermarks = []
+
+    def flaky_queue_due_events(due_events, *args):
+        queued_ids.append([reminder.id for reminder in due_events])
+        return None if len(queued_ids) == 1 else real_queue_due_events(due_events, *args)
+
+    def stop_after_retry(profile, events, now_epoch):
+        watermarks.append(main.load_watermark(watermark_file))
+        if len(queued_ids) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(main, 'queue_due_events', flaky_queue_due_events)
+    monkeypatch.setattr(main, 'update_profile_snapshot', stop_after_retry)
+    tracker = main.NotificationTracker(paths_config['notification_tracker'])
+    try:
+        assert main.run_daemon(profile, tracker) == 0
+        reminder_id = queued_ids[0][0]
+        assert queued_ids == [[reminder_id], [reminder_id]]
+        assert reminder_id in tracker or tracker.is_queued(reminder_id)
+    finally:
+        tracker.close()
+    assert watermarks[0] == last_run
+    assert watermarks[-1] > last_run
+
+
+def test_delivery_pass_records_all_messages_in_one_write(stub_server, tmp_path, monkeypatch):
+    server_url = stub_server()
+    tracker = main.NotificationTracker(str(tmp_path / 'notification_tracker_markdown.sqlite3'))
+    deliveries = []
+    real_delivered = tracker.delivered
+    monkeypatch.setattr(tracker, 'delivered', lambda rows: deliveries.append(len(rows)) or real_delivered(rows))
+    try:
+        tracker.enqueue([{'topic': 'test', 'server': server_url, 'title': 'Task Reminder', 'body': f"Task {index} is due!",
+                          'ids': [f"id_{index}"]} for index in range(3)])
+        assert main.deliver_outbox([tracker], workers=2) == (3, 0)
+        assert deliveries == [3]
+        assert all(f"id_{index}" in tracker for index in range(3))
+        assert tracker.outbox_next_attempt() is None
+    finally:
+        tracker.close()
@@ -0,0 +1,84 @@
+import main
+
+
+def parse(text):
+    return main.parse_markdown_lines(text.splitlines(True), 'pages/Tasks.md')
+
+
+def test_timestamp_attaches_to_its_task():
+    records = parse("- TODO Call Bob\n  SCHEDULED: <2026-10-20 Tue 09:00>\n- TODO Other\n")
+    assert [(record.description, record.kind) for record in records] == [("Call Bob", 'SCHEDULED')]
+
+
+def test_code_block_inside_a_task_is_ignored():
+    records = parse(
+        "- TODO write script\n"
+        "  ```python\n"
+        "  SCHEDULED: <2026-10-20 Tue 09:00>\n"
+        "  - TODO not a task\n"
+        "  ```\n"
+        "  DEADLINE: <2026-10-21 Wed 17:00>\n"
+    )
+    assert [(record.description, record.kind) for record in records] == [("write script", 'DEADLINE')]
+
+
+def test_unindented_fence_inside_a_task_is_ignored():
+    records = parse("- TODO write script\n```\nSCHEDULED: <2026-10-20 Tue 09:00>\n```\n")
+    assert records == []
+
+
+def test_fenced_bullet_ends_the_task():
+    records = parse("- TODO write script\n- ```\n  SCHEDULED: <2026-10-20 Tue 09:00>\n  ```\n  SCHEDULED: <2026-10-21 Wed 09:00>\n")
+    assert records == []
+
+
+def test_inline_code_is_not_a_fence():
+    records = parse("- TODO run ```make``` first\n  SCHEDULED: <2026-10-20 Tue 09:00>\n")
+    assert [record.description for record in records] == ["run ```make``` first"]
+
+
+PAGE_PIECES = [
+    "- TODO task {i}\n", "  - TODO child {i}\n", "\t- LATER tab {i}\n", "TODO bare {i}\n", "- DOING crlf {i}\r\n",
+    "  SCHEDULED: <2026-10-2{d} Tue 09:00>\n", "SCHEDULED: <2026-10-2{d} Tue 10:00 .+1d>\n", "    DEADLINE: <2026-11-0{d} Sun>\n",
+    "  remind:: 1h\n", "  id:: 6650a1b2-0000-0000-0000-00000000000{d}\n", "key:: value\n",
+    "```\n", "  ```python\n", "- ```\n", "  - ```\n", "```a```\n", "- x ```\n", "-```\n", "  ``` ```\n",
+    "- plain {i}\n", "  - sub {i}\n", "prose {i}\n", "  indented prose\n", "\n", "  \n", "-\n", "  -foo\n",
+    "  :LOGBOOK:\n", "  CLOCK: [2026-10-01]\n", "  :END:\n",
+]
+
+
+def record_fields(records):
+    return [(r.line, r.depth, r.marker, r.kind, r.due, r.repeat, r.description, r.key, r.leads) for r in records]
+
+
+def random_page(rng):
+    return ''.join(rng.choice(PAGE_PIECES).format(i=rng.randint(0, 5), d=rng.randint(1, 8)) for _ in range(rng.randint(1, 40)))
+
+
+def test_byte_parser_matches_line_parser():
+    import random
+    rng = random.Random(8)
+    for _ in range(2000):
+        text = random_page(rng)
+        expected = record_fields(main.parse_markdown_lines(text.splitlines(True), 'pages/Tasks.md'))
+        assert record_fields(main.parse_markdown_bytes(text.encode('utf-8'), 'pages/Tasks.md')) == expected, text
+
+
+def test_byte_parser_follows_a_task_past_fenced_bullets():
+    text = "- TODO deploy\n  ```\n  - step one\n  - step two\n  ```\n  SCHEDULED: <2026-10-20 Tue 09:00>\n  remind:: 1h\n"
+    records = main.parse_markdown_bytes(text.encode('utf-8'), 'pages/Tasks.md')
+    assert [(record.description, record.leads) for record in records] == [("deploy", (3600,))]
+    assert record_fields(records) == record_fields(parse(text))
+
+
+def test_mmap_and_small_reads_agree(tmp_path):
+    import random
+    rng = random.Random(9)
+    text = ''.join(random_page(rng) for _ in range(400))
+    while len(text.encode('utf-8')) < main.MMAP_MIN_FILE_BYTES:
+        text += random_page(rng)
+    path = tmp_path / 'big.md'
+    path.write_bytes(text.encode('utf-8'))
+    _, _, records, error, _ = main._parse_markdown_source((str(path), 'pages/big.md', None))
+    assert error is None
+    assert record_fields(records) == record_fields(main.parse_markdown_lines(text.splitlines(True), 'pages/big.md'))
@@ -0,0 +1,29 @@
+import json
+import time
+import urllib.request
+
+import main
+
+
+def event(key, due, repeat=None):
+    return main.TaskRecord('pages/x.md', 1, 0, 'TODO', 'SCHEDULED', due, repeat, key, key)
+
+
+def test_next_leaves_out_reminders_past_the_index_window(tmp_path):
+    now_epoch = time.time()
+    tracker = main.NotificationTracker(str(tmp_path / 'tracker.sqlite3'))
+    api = main.QueryAPI({'port': 0}, tracker, main.lead_time_resolver({}))
+    try:
+        api.update([event('soon', now_epoch + 3600), event('far', now_epoch + 30 * 86400),
+                    event('daily', now_epoch + 7200, (1, 'd'))], now_epoch)
+        url = f"http://127.0.0.1:{api.server.server_address[1]}/next?n=100"
+        with urllib.request.urlopen(url) as response:
+            reminders = json.load(response)['reminders']
+    finally:
+        api.close()
+        tracker.close()
+    descriptions = [reminder['description'] for reminder in reminders]
+    assert 'far' not in descriptions
+    assert descriptions.count('soon') == 1
+    assert descriptions.count('daily') == main.QUERY_API_INDEX_DAYS
+    assert all(reminder['notify_epoch'] <= now_epoch + main.QUERY_API_INDEX_DAYS * 86400 for reminder in reminders)
@@ -0,0 +1,83 @@
+import time
+
+import main
+
+
+def task(description, page='pages/Inbox', leads=None):
+    return main.TaskRecord(page, 1, 0, 'TODO', 'SCHEDULED', time.time() + 3600, None, description, 'key', leads)
+
+
+def test_event_tags():
+    assert main.event_tags("#Work call Bob #[[Big Project]] #home/errands") == {'work', 'big project', 'home/errands'}
+
+
+def test_hash_inside_urls_and_words_is_not_a_tag():
+    assert main.event_tags("read https://example.com/docs#install and fix foo#bar") == set()
+    assert main.event_tags("[#A] see [[Page]]#anchor, then #real") == {'real'}
+
+
+def test_rules_match_on_tag_priority_and_page():
+    rules = main.NotificationRules([
+        {'match': {'tag': '#Work'}, 'topic': 'work'},
+        {'match': {'priority': 'A'}, 'priority': 'urgent'},
+        {'match': {'page': 'Chores'}, 'suppress': True},
+    ])
+    assert rules.settings(task("call Bob #work")) == {'topic': 'work'}
+    assert rules.settings(task("[#A] file taxes")) == {'priority': 'urgent'}
+    assert rules.settings(task("mop", page='pages/Chores')) == {'suppress': True}
+    assert rules.settings(task("[#B] read #home")) == {}
+
+
+def test_every_condition_of_a_rule_must_hold():
+    rules = main.NotificationRules([{'match': {'tag': 'work', 'priority': 'A', 'page': 'Office'}, 'topic': 'boss'}])
+    assert rules.settings(task("[#A] report #work", page='pages/Office')) == {'topic': 'boss'}
+    assert rules.settings(task("[#B] report #work", page='pages/Office')) == {}
+    assert rules.settings(task("[#A] report", page='pages/Office')) == {}
+    assert rules.settings(task("[#A] report #work", page='pages/Home')) == {}
+
+
+def test_later_rules_override_earlier_ones():
+    rules = main.NotificationRules([
+        {'topic': 'everything', 'priority': 'low'},
+        {'match': {'tag': 'work'}, 'topic': 'work'},
+        {'match': {'priority': 'A'}, 'topic': 'urgent', 'tags': 'rotating_light'},
+    ])
+    assert rules.settings(task("water plants")) == {'topic': 'everything', 'priority': 'low'}
+    assert rules.settings(task("report #work")) == {'topic': 'work', 'priority': 'low'}
+    assert rules.settings(task("[#A] report #work")) == {'topic': 'urgent', 'priority': 'low', 'tags': 'rotating_light'}
+
+
+def test_rule_settings_change_the_message():
+    rules = main.NotificationRules([{'match': {'tag': 'work'}, 'topic': 'work', 'priority': 'urgent', 'tags': 'briefcase'}])
+    work = main.Reminder(task("report #work"), 0)
+    message = main.build_event_notification(work, 'default', None, rules.settings(work))
+    assert (message['topic'], message['priority'], message['tags']) == ('work', 'urgent', 'briefcase')
+    home = main.Reminder(task("water plants"), 0)
+    message = main.build_event_notification(home, 'default', None, rules.settings(home))
+    assert (message['topic'], message['priority'], message['tags']) == ('default', 'high', 'alarm_clock,markdown')
+
+
+def test_lead_time_precedence():
+    rules = main.NotificationRules([
+        {'match': {'tag': 'work'}, 'lead_times': ['1h']},
+        {'match': {'page': 'Chores'}, 'suppress': True},
+    ])
+    resolve = main.lead_time_resolver({'lead_times': ['5m'], 'tag_lead_times': {'#home': ['1d'], 'work': ['2d']}}, rules)
+    assert resolve(task("water plants")) == (300,)
+    assert resolve(task("water plants #home")) == (86400,)
+    # A rule's lead times beat tag_lead_times, and a remind:: property beats both.
+    assert resolve(task("report #work")) == (3600,)
+    assert resolve(task("report #work", leads=(600,))) == (600,)
+    # Suppressing leaves no reminder at all, remind:: or not.
+    assert resolve(task("mop", page='pages/Chores', leads=(600,))) == ()
+
+
+def test_rules_match_namespaced_pages_by_their_logseq_name():
+    assert main.page_name('pages/Projects___Alpha') == 'projects/alpha'
+    assert main.page_name('pages/Projects%2FAlpha') == 'projects/alpha'
+    assert main.page_name('journals/2024_05_01') == 'journals/2024_05_01'
+    rules = main.NotificationRules([{'match': {'page': 'Projects/Alpha'}, 'topic': 'alpha'}])
+    assert rules.settings(task("ship it", page='pages/Projects___Alpha')) == {'topic': 'alpha'}
+    assert rules.settings(task("ship it", page='pages/projects%2Falpha')) == {'topic': 'alpha'}
+    assert main.NotificationRules([{'match': {'page': 'Projects___Alpha'}, 'topic': 'alpha'}]).settings(
+        task("ship it", page='pages/Projects___Alpha')) == {'topic': 'alpha'}
@@ -0,0 +1,55 @@
+import multiprocessing
+import threading
+
+import main
+
+
+def write_pages(tmp_path, count):
+    files = []
+    for index in range(count):
+        path = tmp_path / f"page{index}.md"
+        path.write_text(f"- TODO task {index}\n  SCHEDULED: <2099-01-01 Thu 09:00>\n", encoding='utf-8')
+        files.append((str(path), f"pages/page{index}.md"))
+    return files
+
+
+def test_workers_are_not_forked_while_other_threads_run(tmp_path, monkeypatch):
+    start_methods = []
+    get_context = multiprocessing.get_context
+
+    def recording_get_context(method=None):
+        start_methods.append(method)
+        return get_context(method)
+
+    monkeypatch.setattr(multiprocessing, 'get_context', recording_get_context)
+    files = write_pages(tmp_path, main.PARALLEL_SCAN_MIN_FILES)
+    release = threading.Event()
+    other_thread = threading.Thread(target=release.wait)
+    other_thread.start()
+    try:
+        events, failed_paths = main.scan_markdown_files(files, workers=2)
+    finally:
+        release.set()
+        other_thread.join()
+    assert failed_paths == []
+    assert len(events) == len(files)
+    assert start_methods and start_methods[-1] in ('forkserver', 'spawn')
+
+
+def test_changed_settled_journal_page_is_read_again(tmp_path):
+    from datetime import datetime, timedelta
+    day = datetime.now() - timedelta(days=main.JOURNAL_SETTLED_DAYS + 30)
+    page = f"journals/{day:%Y_%m_%d}"
+    path = tmp_path / f"{day:%Y_%m_%d}.md"
+    path.write_text(f"- TODO old task\n  SCHEDULED: <{day:%Y-%m-%d %a} 09:00>\n", encoding='utf-8')
+    cache_file = str(tmp_path / main.PARSE_CACHE_FILE_NAME)
+    files = [(str(path), page)]
+    now_epoch = datetime.now().timestamp()
+    assert main.scan_markdown_files(files, cache_file, 1, now_epoch) == ([], [])
+
+    path.write_text(f"- TODO old task\n  SCHEDULED: <{day:%Y-%m-%d %a} 09:00>\n"
+                    f"- TODO new task\n  SCHEDULED: <2099-01-01 Thu 09:00>\n", encoding='utf-8')
+    # Without being told, the settled page is skipped until the next daily check.
+    assert main.scan_markdown_files(files, cache_file, 1, now_epoch) == ([], [])
+    events, _ = main.scan_markdown_files(files, cache_file, 1, now_epoch, {path.name})
+    assert "new task" in [event.description for event in events]
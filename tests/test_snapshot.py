@@ -0,0 +1,74 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import main
+
+
+def task(index, due, description=None, repeat=None):
+    return main.TaskRecord('pages/Inbox', index, 0, 'TODO', 'SCHEDULED', due, repeat, description or f"task {index}", f"k{index}")
+
+
+def snapshot_files(tmp_path):
+    return str(tmp_path / main.SNAPSHOT_JSON_FILE_NAME), str(tmp_path / main.SNAPSHOT_ICS_FILE_NAME)
+
+
+def unfolded_ics_lines(ics_file):
+    with open(ics_file, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+    assert content.endswith("\r\n") and "\n" not in content.replace("\r\n", "")
+    assert all(len(line.encode('utf-8')) <= 75 for line in content.split("\r\n"))
+    return content.replace("\r\n ", "").split("\r\n")[:-1]
+
+
+def test_unchanged_snapshot_is_not_rewritten(tmp_path):
+    json_file, ics_file = snapshot_files(tmp_path)
+    now = time.time()
+    events = [task(0, now + 3600), task(1, now + 7200)]
+    assert main.write_snapshot(events, {}, json_file, ics_file, now)
+    written = [(os.stat(path).st_ino, os.stat(path).st_mtime_ns) for path in (json_file, ics_file)]
+    assert not main.write_snapshot(events, {}, json_file, ics_file, now + 60)
+    assert [(os.stat(path).st_ino, os.stat(path).st_mtime_ns) for path in (json_file, ics_file)] == written
+    assert main.write_snapshot(events[:1], {}, json_file, ics_file, now + 120)
+    with open(json_file, 'r', encoding='utf-8') as f:
+        assert [event['description'] for event in json.load(f)['events']] == ['task 0']
+
+
+def test_repeating_tasks_are_expanded_within_days(tmp_path):
+    json_file, ics_file = snapshot_files(tmp_path)
+    now = time.time()
+    events = [task(0, now + 3600, "stretch", repeat=(1, 'd')), task(1, now + 10 * 86400, "too far")]
+    main.write_snapshot(events, {'days': 3}, json_file, ics_file, now)
+    with open(json_file, 'r', encoding='utf-8') as f:
+        snapshot = json.load(f)
+    assert [event['description'] for event in snapshot['events']] == ['stretch'] * 3
+    assert all(event['repeats'] for event in snapshot['events'])
+    assert len({event['id'] for event in snapshot['events']}) == 3
+
+
+def test_snapshot_is_capped_at_max_items(tmp_path):
+    json_file, ics_file = snapshot_files(tmp_path)
+    now = time.time()
+    events = [task(index, now + (10 - index) * 3600) for index in range(10)]
+    main.write_snapshot(events, {'max_items': 4}, json_file, ics_file, now)
+    with open(json_file, 'r', encoding='utf-8') as f:
+        assert [event['description'] for event in json.load(f)['events']] == ['task 9', 'task 8', 'task 7', 'task 6']
+    assert unfolded_ics_lines(ics_file).count("BEGIN:VEVENT") == 4
+
+
+def test_ics_output_is_valid(tmp_path):
+    json_file, ics_file = snapshot_files(tmp_path)
+    now = time.time()
+    due = (int(now) // 60 + 90) * 60
+    description = "Call Bob; bring notes, slides and C:\\temp " + "ü" * 60
+    main.write_snapshot([task(0, due, description), task(1, due + 60)], {}, json_file, ics_file, now)
+    lines = unfolded_ics_lines(ics_file)
+    assert lines[0] == "BEGIN:VCALENDAR" and lines[-1] == "END:VCALENDAR"
+    assert "VERSION:2.0" in lines
+    assert lines.count("BEGIN:VEVENT") == lines.count("END:VEVENT") == 2
+    fields = dict(line.split(':', 1) for line in lines[lines.index("BEGIN:VEVENT") + 1:lines.index("END:VEVENT")])
+    assert fields['SUMMARY'] == r"Call Bob\; bring notes\, slides and C:\\temp " + "ü" * 60
+    assert fields['DTSTART'] == datetime.fromtimestamp(due, timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    assert fields['UID'] == f"{task(0, due).id}@logseq-notify"
+    assert len({line for line in lines if line.startswith("UID:")}) == 2
@@ -0,0 +1,42 @@
+import os
+import time
+
+import main
+
+
+def test_text_tracker_is_migrated_once(tmp_path, capsys):
+    tracker_file = str(tmp_path / 'notification_tracker_markdown.txt')
+    with open(tracker_file, 'w', encoding='utf-8') as f:
+        f.write("logseq_md_event_a_202401010900\nlogseq_md_event_b_202401020900\n\nlogseq_md_event_a_202401010900\n")
+    tracker = main.NotificationTracker(tracker_file)
+    try:
+        assert len(tracker) == 2
+        assert 'logseq_md_event_b_202401020900' in tracker
+    finally:
+        tracker.close()
+    assert tracker.db_path == str(tmp_path / 'notification_tracker_markdown.sqlite3')
+    assert not os.path.exists(tracker_file)
+    assert os.path.exists(tracker_file + '.migrated')
+    assert "Error" not in capsys.readouterr().out
+
+    # Later runs find only the .migrated file and open the database as it is.
+    tracker = main.NotificationTracker(tracker_file)
+    try:
+        assert len(tracker) == 2
+    finally:
+        tracker.close()
+    assert os.path.exists(tracker_file + '.migrated')
+    assert "Error" not in capsys.readouterr().out
+
+
+def test_expired_entries_are_dropped_when_opened(tmp_path):
+    tracker_file = str(tmp_path / 'notification_tracker_markdown.sqlite3')
+    tracker = main.NotificationTracker(tracker_file)
+    with tracker.conn:
+        tracker.conn.executemany("INSERT INTO sent (id, sent_at) VALUES (?, ?)", [('old', 0), ('new', int(time.time()))])
+    tracker.close()
+    tracker = main.NotificationTracker(tracker_file, retention_days=90)
+    try:
+        assert 'new' in tracker and 'old' not in tracker
+    finally:
+        tracker.close()